@@ -0,0 +1,51 @@
+# ------------------------------------------------------------
+# BOOT-PHASE TRACER
+# ------------------------------------------------------------
+#
+# Timestamps the phases of code.py startup (imports, sound loading, display
+# init, start screen...) so we can see where the wait before the game
+# becomes interactive goes. Create it first thing in code.py, mark() at
+# the end of each phase, finish() once the game loop is about to start:
+#
+#     boot_trace = BootTrace()
+#     import adafruit_icm20x
+#     boot_trace.mark("import adafruit_icm20x")
+#     ...
+#     boot_trace.finish()   # prints one line per phase
+#
+# Times are ticks_ms() differences from the previous mark, so the phases
+# add up to the total. Marks after finish() are ignored, which lets code
+# that also runs later (start()) call mark() unconditionally.
+
+from timebase import ticks_diff, ticks_ms
+
+
+class BootTrace:
+    def __init__(self):
+        self.start = self._last = ticks_ms()
+        self.phases = []        # (name, ms since the previous mark)
+        self.done = False
+
+    def mark(self, name):
+        if self.done:
+            return
+        now = ticks_ms()
+        self.phases.append((name, ticks_diff(now, self._last)))
+        self._last = now
+
+    def total(self):
+        return ticks_diff(self._last, self.start)
+
+    def summary(self):
+        width = max((len(name) for name, _ in self.phases), default=0)
+        lines = [f"Boot: {self.total()} ms"]
+        for name, ms in self.phases:
+            lines.append("  " + name + " " * (width - len(name)) + f" {ms:6d} ms")
+        return "\n".join(lines)
+
+    def finish(self, write=print):
+        """Stop recording and write the per-phase report."""
+        if self.done:
+            return
+        self.done = True
+        write(self.summary())
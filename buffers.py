@@ -0,0 +1,46 @@
+# ------------------------------------------------------------
+# SAMPLE BUFFERS
+# ------------------------------------------------------------
+#
+# Audio buffers are big (32 KB per second at 16 kHz) and the heap is
+# small, so they are allocated once at their final size:
+#
+#     samples = zeros(count)    # array('h'), then filled in place
+#
+# array('h', [0] * count) would first build a list of 4 bytes per sample,
+# and growing an array copies it. array() built from a range() knows its
+# length up front and allocates once; the range runs over int16 values
+# (-32768...), so one buffer holds at most MAX_SAMPLES (4 s at 16 kHz,
+# 128 KB, more than the heap has to spare). The values are then zeroed by
+# slice copies from a small block of zeros; clear() zeroes part of a
+# buffer the same way.
+
+import array
+
+MAX_SAMPLES = 65536     # int16 values a range() can run over
+ZERO_CHUNK = 256        # samples zeroed per slice copy
+
+_zero_block = None
+
+
+def zeros(count):
+    """array('h') of 'count' zeros, allocated once (ValueError above MAX_SAMPLES)."""
+    if count > MAX_SAMPLES:
+        raise ValueError("buffer longer than MAX_SAMPLES")
+    samples = array.array("h", range(-32768, count - 32768))
+    clear(samples, 0, count)
+    return samples
+
+
+def clear(samples, start, end):
+    """Zero samples[start:end] of an array('h')."""
+    global _zero_block
+    if _zero_block is None:
+        _zero_block = array.array("h", range(ZERO_CHUNK))
+        for i in range(ZERO_CHUNK):
+            _zero_block[i] = 0
+    full = end - (end - start) % ZERO_CHUNK
+    for i in range(start, full, ZERO_CHUNK):
+        samples[i:i + ZERO_CHUNK] = _zero_block
+    for i in range(full, end):
+        samples[i] = 0
@@ -2,22 +2,46 @@
 # RHYTHM GAME WITH REAL IMU SHAKE DETECTION (NO DISPLAY)
 # ------------------------------------------------------------
 
+# First, so the imports below are timed (see boottrace.py)
+from boottrace import BootTrace
+boot_trace = BootTrace()
+
 import time
-import math
+import asyncio
 import board
-import adafruit_icm20x
-from adafruit_icm20x import AccelRange, GyroRange
 from audioio import AudioOut
-from audiocore import WaveFile
+try:
+    import audiomixer
+except ImportError:
+    audiomixer = None
 import displayio
 import digitalio
 import microcontroller
+boot_trace.mark("import core modules")
+import adafruit_icm20x
+from adafruit_icm20x import AccelRange, GyroRange
+boot_trace.mark("import adafruit_icm20x")
 from fourwire import FourWire
 from adafruit_st7789 import ST7789
-import terminalio
-from adafruit_display_text import label
-
-GRAVITY = 9.8
+boot_trace.mark("import display drivers")
+# terminalio and adafruit_display_text (label) are only needed for the
+# result screens: imported by result_screen() after the first round
+from difficulty import DifficultySelector
+from levels import Level, LEVELS, prepare_levels, score_hits
+from detector import ShakeDetector, enough_motion, thresholds_from_peaks
+from scheduler import LatenessStats, Scheduler, sleep_until
+from profiler import LoopProfiler
+from gcguard import GCGuard
+from imu import BurstReader
+from ringlog import RingLog, DEBUG
+from voices import VoiceManager
+from sounds import SoundRegistry
+from patterns import PatternRenderer
+from feedback import FeedbackBank
+import synth
+import events
+from timebase import ticks_ms, ticks_add, ticks_diff, seconds_to_ms
+boot_trace.mark("import game modules")
 
 # ============================================================
 # AUDIO SETUP
@@ -25,32 +49,115 @@ GRAVITY = 9.8
 
 audio = AudioOut(board.DAC)
 
-def load_wav(filename):
-    try:
-        fp = open(filename, "rb")
-        wav = WaveFile(fp)
-        print("Loaded:", filename)
-        return fp, wav
-    except Exception as e:
-        print("ERROR loading", filename, ":", e)
-        return None, None
-
-# WAV locations (same directories as your working test!)
-beat_fp, beat_wav = load_wav("beat.wav")
-clap_fp, clap_wav = load_wav("clap-drum.wav")
-success_fp, success_wav = load_wav("success.wav")
-fail_fp, fail_wav = load_wav("fail.wav")
-go_fp, go_wav = load_wav("go.wav")
-boot_fp, boot_wav = load_wav("boot.wav")
-
-def play_wav(fp, wav):
-    if not wav:
-        print("[Missing WAV]")
+# Sounds play through an audiomixer.Mixer (see voices.py), so hit feedback,
+# claps and cues overlap instead of cutting each other off. Every WAV must
+# match the mixer: 16 kHz, mono, 16-bit signed. USE_MIXER = False (or a
+# build without audiomixer) goes back to one sound at a time.
+USE_MIXER = True
+MIXER_SAMPLE_RATE = 16000
+MIXER_BUFFER_SIZE = 512   # bytes; a new sound is heard within ~2 buffers (16 ms each)
+VOICE_CHANNELS = {        # channel: (mixer voice, level)
+    "cue": (0, 1.0),      # boot, go, success, fail
+    "pattern": (1, 1.0),  # claps
+    "feedback": (2, 0.8), # beat on each hit
+}
+
+if USE_MIXER and audiomixer is not None:
+    mixer = audiomixer.Mixer(
+        voice_count=len(VOICE_CHANNELS),
+        sample_rate=MIXER_SAMPLE_RATE,
+        channel_count=1,
+        bits_per_sample=16,
+        samples_signed=True,
+        buffer_size=MIXER_BUFFER_SIZE,
+    )
+    audio.play(mixer)
+    voices = VoiceManager(mixer.voice, VOICE_CHANNELS)
+else:
+    voices = None
+
+audio_sample = None   # what the AudioOut plays when there is no mixer
+
+
+def sample_playing(sample):
+    if voices is not None:
+        return voices.is_playing(sample)
+    return sample is audio_sample and audio.playing
+
+
+def stop_sample(sample):
+    global audio_sample
+    if voices is not None:
+        voices.stop_sample(sample)
+    elif sample is audio_sample:
+        audio.stop()
+        audio_sample = None
+
+
+# Short sounds are read into RAM now, so hits and claps never wait on
+# flash; long ones are opened when played and closed afterwards, with at
+# most MAX_OPEN_SOUNDS files open (see sounds.py)
+sounds = SoundRegistry(sample_playing, stop_sample)
+
+# The hit feedback and the clap are synthesized at boot instead of loaded
+# from WAVs (see synth.py): (kind, Hz, duration ms, decay ms, level).
+# SYNTH_FEEDBACK = False plays beat.wav and clap-drum.wav instead.
+SYNTH_FEEDBACK = True
+SYNTH_SOUNDS = {
+    "beat": ("tone", 1320, 90, 25, 0.8),
+    "clap-drum": ("noise", 3500, 90, 18, 0.9),
+}
+
+wav_sounds = ["success", "fail", "go", "boot"]
+if SYNTH_FEEDBACK:
+    for name, params in SYNTH_SOUNDS.items():
+        sounds.add_pcm(name, synth.render(params, MIXER_SAMPLE_RATE), MIXER_SAMPLE_RATE)
+        print("Synthesized:", name, params)
+else:
+    wav_sounds = ["beat", "clap-drum"] + wav_sounds
+for name in wav_sounds:
+    if sounds.add(name, name + ".wav"):
+        print("Loaded:", name + ".wav", "(RAM)" if name in sounds.resident else "(on demand)")
+
+# Patterns are played as one sound, with the claps copied in at exact
+# sample offsets as it plays, so the gaps between claps are exact (see
+# patterns.py). RENDER_PATTERNS = False plays them clap by clap.
+RENDER_PATTERNS = True
+clap_pcm = sounds.pcm.get("clap-drum")
+if RENDER_PATTERNS and clap_pcm is not None:
+    pattern_renderer = PatternRenderer(clap_pcm, MIXER_SAMPLE_RATE, sample_playing, stop_sample)
+else:
+    pattern_renderer = None
+
+# The hit feedback is louder the harder the strike: gain-scaled copies of
+# the beat are made here, once, and each hit picks one (see feedback.py).
+# STRENGTH_FEEDBACK = False always plays the full beat.
+STRENGTH_FEEDBACK = True
+beat_pcm = sounds.pcm.get("beat")
+if STRENGTH_FEEDBACK and beat_pcm is not None:
+    feedback_bank = FeedbackBank(beat_pcm, MIXER_SAMPLE_RATE)
+else:
+    feedback_bank = None
+boot_trace.mark("sound loading")
+
+def play_sound(name, channel="cue", priority=0):
+    """Play a sound by name; returns its sample (None if it is missing)."""
+    sample = sounds.get(name)
+    if sample is None:
+        print("[Missing WAV]", name)
+        return None
+    play_sample(sample, channel, priority, sounds.loops(sample))
+    return sample
+
+def play_sample(sample, channel="cue", priority=0, loop=False):
+    global audio_sample
+    if voices is not None:
+        voices.play(sample, channel, priority, loop)
         return
     if audio.playing:
         audio.stop()
-    fp.seek(0)
-    audio.play(wav)
+    audio_sample = sample
+    audio.play(sample, loop=loop)
 
 # ============================================================
 # IMU SETUP
@@ -62,7 +169,15 @@ icm = adafruit_icm20x.ICM20948(i2c, 0x69)
 icm.accelerometer_range = AccelRange.RANGE_4G
 icm.gyro_range = GyroRange.RANGE_1000_DPS
 
+# Accel + gyro in one I2C read into a fixed buffer (no allocation per sample)
+imu_burst = BurstReader(
+    icm.i2c_device,
+    AccelRange.lsb[icm.accelerometer_range],
+    GyroRange.lsb[icm.gyro_range],
+)
+
 print("IMU configured: accel=±4g, gyro=±1000dps\n")
+boot_trace.mark("IMU init")
 
 
 
@@ -76,7 +191,7 @@ print("IMU configured: accel=±4g, gyro=±1000dps\n")
 # =========================
 ROTATION = 180  # 0, 90, 180, 270
 
-FRAME_DURATION = 0.005  # tiempo por frame (segundos)
+FRAME_DURATION_MS = 5  # tiempo por frame (milisegundos)
 
 # Rutas de los BMP (135x240)
 FRAME_FILES = [
@@ -117,11 +232,14 @@ display = ST7789(
 # Grupo raíz
 splash = displayio.Group()
 display.root_group = splash
+boot_trace.mark("display init")
 
-def start(tiempo):
+def start(tiempo, motion=None):
     """
     Muestra la imagen 'start.bmp' a pantalla completa
     durante 'tiempo' segundos y luego la quita.
+    Con 'motion' (MotionPeaks) calibra el IMU mientras tanto
+    en vez de dormir.
     """
     # Abrir el BMP (debe estar en CIRCUITPY como /start.bmp)
     f = open("/start.bmp", "rb")
@@ -130,9 +248,13 @@ def start(tiempo):
 
     # Mostrar la imagen
     splash.append(tile)
+    boot_trace.mark("start screen shown")
 
     # Mantenerla en pantalla el tiempo indicado
-    time.sleep(tiempo)
+    if motion is None:
+        time.sleep(tiempo)
+    else:
+        motion.sample_until(ticks_add(ticks_ms(), seconds_to_ms(tiempo)), sounds.poll)
 
     # Quitar la imagen y cerrar el archivo
     splash.remove(tile)
@@ -142,415 +264,656 @@ def start(tiempo):
 background_bitmap = displayio.Bitmap(DISPLAY_WIDTH, DISPLAY_HEIGHT, 1)
 
 # =========================
-# FUNCIÓN success(tiempo)
+# PANTALLAS DE RESULTADO
 # =========================
-def success(tiempo):
+def result_screen(color, top_text, bottom_text):
     """
-    Muestra el fondo verde y los textos:
-        WELL
-        DONE
-    centrados durante 'tiempo' segundos.
-    Luego elimina los textos.
+    Grupo con el fondo de 'color' y dos textos centrados
+    (negro, escala 4). Se construye la primera vez que se muestra.
     """
+    # Import diferido: no retrasa el arranque
+    import terminalio
+    from adafruit_display_text import label
+
+    group = displayio.Group()
+
     background_palette = displayio.Palette(1)
-    background_palette[0] = 0x00FF00  # verde
-    background = displayio.TileGrid(background_bitmap, pixel_shader=background_palette)
-    splash.append(background)
-
-    # LABEL "WELL"
-    well_label = label.Label(
-        terminalio.FONT,
-        text="WELL",
-        color=0x000000,  # negro sobre verde
-        scale=4          # tamaño del texto
-    )
-    well_label.anchor_point = (0.5, 0.5)
-    well_label.anchored_position = (DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2 - 20)
-
-    # LABEL "DONE"
-    done_label = label.Label(
-        terminalio.FONT,
-        text="DONE",
-        color=0x000000,
-        scale=4
-    )
-    done_label.anchor_point = (0.5, 0.5)
-    done_label.anchored_position = (DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2 + 20)
-
-    # Mostrar ambos labels
-    splash.append(well_label)
-    splash.append(done_label)
-    
-    # Mantener en pantalla
-    time.sleep(tiempo)
-
-    # Quitar los labels (el fondo verde permanece)
-    splash.remove(well_label)
-    splash.remove(done_label)
-    splash.remove(background)
-
-def failure(tiempo):
-    background_palette = displayio.Palette(1)
-    background_palette[0] = 0xFF0000  # rojo
+    background_palette[0] = color
     background = displayio.TileGrid(background_bitmap, pixel_shader=background_palette)
-    splash.append(background)
+    group.append(background)
+
+    top_label = label.Label(terminalio.FONT, text=top_text, color=0x000000, scale=4)
+    top_label.anchor_point = (0.5, 0.5)
+    top_label.anchored_position = (DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2 - 20)
+    group.append(top_label)
+
+    bottom_label = label.Label(terminalio.FONT, text=bottom_text, color=0x000000, scale=4)
+    bottom_label.anchor_point = (0.5, 0.5)
+    bottom_label.anchored_position = (DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2 + 20)
+    group.append(bottom_label)
+
+    return group
+
+RESULT_SCREENS = {
+    "success": (0x00FF00, "WELL", "DONE"),   # verde
+    "failure": (0xFF0000, "TRY", "AGAIN"),   # rojo
+}
+result_screens = {}
+
+
+def get_result_screen(name):
+    """The result screen 'name', built (and timed) on first use."""
+    group = result_screens.get(name)
+    if group is None:
+        t0 = ticks_ms()
+        group = result_screens[name] = result_screen(*RESULT_SCREENS[name])
+        print(f"Built {name} screen in {ticks_diff(ticks_ms(), t0)} ms")
+    return group
+
+async def show_screen(group, tiempo):
     """
-    Muestra el fondo rojo y los textos:
-        TRY
-        AGAIN
-    centrados durante 'tiempo' segundos.
-    Luego elimina los textos.
+    Muestra 'group' durante 'tiempo' segundos sin bloquear (el IMU sigue
+    muestreando). Un golpe de batuta la quita antes; devuelve True si
+    fue así.
     """
+    splash.append(group)
+    skipped = await wait_or_shake(seconds_to_ms(tiempo), SKIP_GRACE_MS)
+    splash.remove(group)
+    return skipped
 
-    # LABEL "TRY"
-    try_label = label.Label(
-        terminalio.FONT,
-        text="TRY",
-        color=0x000000,  # negro sobre rojo
-        scale=4          # tamaño del texto
-    )
-    try_label.anchor_point = (0.5, 0.5)
-    try_label.anchored_position = (DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2 - 20)
-
-    # LABEL "AGAIN"
-    again_label = label.Label(
-        terminalio.FONT,
-        text="AGAIN",
-        color=0x000000,
-        scale=4
-    )
-    again_label.anchor_point = (0.5, 0.5)
-    again_label.anchored_position = (DISPLAY_WIDTH // 2, DISPLAY_HEIGHT // 2 + 20)
-
-    # Mostrar ambos labels
-    splash.append(try_label)
-    splash.append(again_label)
-    
-    # Mantener en pantalla
-    time.sleep(tiempo)
+async def success(tiempo):
+    """Fondo verde con WELL / DONE durante 'tiempo' segundos."""
+    return await show_screen(get_result_screen("success"), tiempo)
 
-    # Quitar los labels (el fondo rojo permanece)
-    splash.remove(try_label)
-    splash.remove(again_label)
-    splash.remove(background)
+async def failure(tiempo):
+    """Fondo rojo con TRY / AGAIN durante 'tiempo' segundos."""
+    return await show_screen(get_result_screen("failure"), tiempo)
 
 
 # ============================================================
 # QUICK CALIBRATION
 # ============================================================
 
-def quick_calibration(duration=3.0):
-    print(f"\nCalibrating for {duration}s... Move the baton.\n")
+calibration_profile = LoopProfiler("calib", 5)  # periods of the sampling loop
 
-    start_t = time.monotonic()
-    next_frame_t = start_t
-    frame_index = 0
 
-    max_acc_g = 0.0
-    max_gyro = 0.0
+class MotionPeaks:
+    """Peak motion read from the IMU during calibration, and the read rate."""
 
-    # Pre-load bitmaps once for speed
-    frames = []
-    for path in FRAME_FILES:
-        f = open(path, "rb")
-        bmp = displayio.OnDiskBitmap(f)
-        tile = displayio.TileGrid(bmp, pixel_shader=bmp.pixel_shader)
-        frames.append((tile, f))
+    def __init__(self):
+        self.max_acc_g = 0.0
+        self.max_gyro = 0.0
+        self.samples = 0
+        self.sampled_ms = 0
 
-    # Show first frame
-    splash.append(frames[0][0])
+    def sample_until(self, until, on_sample=None):
+        """Read the IMU until 'until' (ticks); on_sample(now) after each read."""
+        start_t = ticks_ms()
+        calibration_profile.restart()
+        while True:
+            now = ticks_ms()
+            if ticks_diff(now, until) >= 0:
+                break
+            calibration_profile.tick(now)
+
+            # ---- IMU SAMPLING ----
+            imu_burst.read()
+            accel_extra = imu_burst.accel_extra
+            gyro_mag = imu_burst.gyro_mag
+
+            if accel_extra > self.max_acc_g:
+                self.max_acc_g = accel_extra
+            if gyro_mag > self.max_gyro:
+                self.max_gyro = gyro_mag
+            self.samples += 1
+
+            if on_sample is not None:
+                on_sample(now)
+
+            # Tiny sleep to allow USB tasks + display refresh
+            time.sleep(0.005)
+        self.sampled_ms += ticks_diff(ticks_ms(), start_t)
 
-    while True:
-        now = time.monotonic()
-        elapsed = now - start_t
 
-        # End calibration
-        if elapsed >= duration:
-            break
+def quick_calibration(duration=3.0, motion=None):
+    """
+    Compute the shake thresholds. 'motion' holds what was already sampled
+    (the start screen); the calibration animation only runs, for
+    'duration' seconds, if that was too little motion.
+    """
+    if motion is None:
+        motion = MotionPeaks()
 
-        # ---- IMU SAMPLING ----
-        ax, ay, az = icm.acceleration
-        gx, gy, gz = icm.gyro
+    if enough_motion(motion.max_acc_g, motion.max_gyro):
+        print("\nCalibrated during the start screen.")
+    else:
+        print(f"\nCalibrating for {duration}s... Move the baton.\n")
 
-        accel_mag = math.sqrt(ax*ax + ay*ay + az*az)
-        accel_extra = max(0, (accel_mag - GRAVITY)/GRAVITY)
-        gyro_mag = math.sqrt(gx*gx + gy*gy + gz*gz)
+        # Pre-load bitmaps once for speed
+        frames = []
+        for path in FRAME_FILES:
+            f = open(path, "rb")
+            bmp = displayio.OnDiskBitmap(f)
+            tile = displayio.TileGrid(bmp, pixel_shader=bmp.pixel_shader)
+            frames.append((tile, f))
 
-        if accel_extra > max_acc_g:
-            max_acc_g = accel_extra
-        if gyro_mag > max_gyro:
-            max_gyro = gyro_mag
+        # Show first frame
+        splash.append(frames[0][0])
+        frame_index = 0
+        next_frame_t = ticks_ms()
 
         # ---- FRAME UPDATE (non-blocking) ----
-        if now >= next_frame_t:
-            # Remove old frame
-            splash.pop()
+        def next_frame(now):
+            nonlocal frame_index, next_frame_t
+            if ticks_diff(now, next_frame_t) >= 0:
+                # Remove old frame
+                splash.pop()
 
-            # Move to next frame
-            frame_index = (frame_index + 1) % len(frames)
-            splash.append(frames[frame_index][0])
+                # Move to next frame
+                frame_index = (frame_index + 1) % len(frames)
+                splash.append(frames[frame_index][0])
 
-            next_frame_t = now + FRAME_DURATION
+                next_frame_t = ticks_add(now, FRAME_DURATION_MS)
 
-        # Tiny sleep to allow USB tasks + display refresh
-        time.sleep(0.005)
+        motion.sample_until(ticks_add(ticks_ms(), seconds_to_ms(duration)), next_frame)
 
-    # Cleanup — remove animation and close files
-    if len(splash) > 0:
-        splash.pop()
+        # Cleanup — remove animation and close files
+        if len(splash) > 0:
+            splash.pop()
 
-    for tile, f in frames:
-        f.close()
+        for tile, f in frames:
+            f.close()
 
     # ---- Compute thresholds ----
-    accel_th = max(0.8, max_acc_g * 0.35)
-    gyro_th = max(3.0, max_gyro * 0.45)
+    accel_th, gyro_th = thresholds_from_peaks(motion.max_acc_g, motion.max_gyro)
+
+    # Same read + sleep cadence as the input loop: one period is how late
+    # a hit can be timestamped
+    loop_period_ms = motion.sampled_ms // motion.samples if motion.samples else 20
 
     print("\nCalibration done.")
-    print(f"Max accel extra g: {max_acc_g:.2f}")
-    print(f"Max gyro rad/s:   {max_gyro:.2f}")
+    print(f"Max accel extra g: {motion.max_acc_g:.2f}")
+    print(f"Max gyro rad/s:   {motion.max_gyro:.2f}")
     print(f"Accel threshold:  {accel_th:.2f}")
-    print(f"Gyro threshold:   {gyro_th:.2f}\n")
+    print(f"Gyro threshold:   {gyro_th:.2f}")
+    print(f"Sensor loop:      {loop_period_ms} ms")
+    print(" ", calibration_profile.summary())
+    print()
 
-    return accel_th, gyro_th
+    return accel_th, gyro_th, loop_period_ms
 
 
-play_wav(boot_fp,boot_wav)
-start(5)
+# Calibrate while the start screen is up and boot.wav plays; the
+# calibration animation only appears if the baton was not moved
+print("\nCalibrating during the start screen... Move the baton.\n")
+boot_motion = MotionPeaks()
+play_sound("boot")
+start(5, boot_motion)
+boot_trace.mark("start screen + boot calibration")
 
-ACCEL_TH, GYRO_TH = quick_calibration()
+ACCEL_TH, GYRO_TH, SENSOR_LATENCY_MS = quick_calibration(motion=boot_motion)
+prepare_levels(LEVELS, SENSOR_LATENCY_MS)
+boot_trace.mark("calibration")
 
 # ============================================================
 # REAL SHAKE DETECTOR
 # ============================================================
 
-COOLDOWN = 0.25
-FILTER_ALPHA = 0.30
-
-accel_f = 0
-gyro_f = 0
-last_shake_time = 0
-
-def detect_shake():
-    """Returns True exactly when a beat/shake happens."""
-    global accel_f, gyro_f, last_shake_time
-
-    ax, ay, az = icm.acceleration
-    gx, gy, gz = icm.gyro
-
-    accel_mag = math.sqrt(ax*ax + ay*ay + az*az)
-    accel_extra = max(0, (accel_mag - GRAVITY)/GRAVITY)
-    gyro_mag = math.sqrt(gx*gx + gy*gy + gz*gz)
-
-    # filtering
-    accel_f = accel_f*(1-FILTER_ALPHA) + accel_extra*FILTER_ALPHA
-    gyro_f = gyro_f*(1-FILTER_ALPHA) + gyro_mag*FILTER_ALPHA
-
-    now = time.monotonic()
+shake_detector = ShakeDetector(ACCEL_TH, GYRO_TH)
 
-    shake = (accel_f > ACCEL_TH) or (gyro_f > GYRO_TH)
-    cooldown_ok = (now - last_shake_time) > COOLDOWN
+def detect_shake(now):
+    """Read the IMU once; True exactly when a beat/shake happens."""
+    imu_burst.read()
+    return shake_detector.update_motion(imu_burst.accel_extra, imu_burst.gyro_mag, now)
 
-    if shake and cooldown_ok:
-        last_shake_time = now
-        play_wav(beat_fp, beat_wav)
-        return True
-
-    return False
+# ============================================================
+# ASYNC RUNTIME
+# ============================================================
+#
+# Four asyncio tasks share the ticks_ms() timebase:
+#   imu_task     — samples the IMU every SENSOR_POLL_MS, all the time
+#   player_task  — fires pattern claps at their absolute deadlines
+#   display_task — timed screen changes (feedback flashes, result screens),
+#                  and keeps μ-law sounds decoding
+#   game_task    — the scorer: runs rounds, grades hits, picks levels
+# Each of the first three owns a Scheduler (per-task lateness stats); the
+# game task records its own waits in game_stats.
+
+SENSOR_POLL_MS = 5  # between IMU reads
+SKIP_GRACE_MS = 300  # shakes this soon after a result screen appears don't skip it
+STREAM_POLL_MS = 20  # μ-law sounds and patterns write their next chunk when due (see ring.py)
+
+imu_sched = Scheduler()
+player_sched = Scheduler()
+display_sched = Scheduler()
+game_stats = LatenessStats("game")
+
+imu_sched.yield_to(player_sched)  # a poll never delays a clap
+
+MAX_HITS = 32        # hits kept per round; later ones are ignored
+
+listening = False    # True while the player's hits count
+hits = [0] * MAX_HITS  # ticks of hits while listening (preallocated)
+hit_count = 0
+hit_handler = None   # optional hit_handler(now), called right after a hit
+
+# Sampling period histograms, while the pattern plays and while the player
+# repeats it; sample() feeds whichever loop_profile points at
+play_profile = LoopProfiler("play", SENSOR_POLL_MS)
+input_profile = LoopProfiler("input", SENSOR_POLL_MS)
+loop_profile = None
+
+# gc.collect() before each listen / input window, automatic GC held off
+# inside it when the heap has room (see gcguard.py)
+gc_guard = GCGuard(SENSOR_POLL_MS)
+
+wake = asyncio.Event()  # ends wait_or_shake()
+skip_after = None       # ticks from which a shake ends the wait; None: not waiting
+shake_skipped = False
+
+
+def sample(now):
+    global shake_skipped, hit_count
+    if loop_profile is not None:
+        loop_profile.tick(now)
+    gc_guard.sample(now)
+    if not detect_shake(now):
+        return
+    events.emit("shake", now)
+    if listening:
+        if feedback_bank is not None:
+            play_sample(feedback_bank.pick(shake_detector.strength), "feedback")
+        else:
+            play_sound("beat", "feedback")
+        if hit_count < MAX_HITS:
+            hits[hit_count] = now
+            hit_count += 1
+        if hit_handler is not None:
+            hit_handler(now)
+    elif skip_after is not None and ticks_diff(now, skip_after) >= 0:
+        shake_skipped = True
+        wake.set()
+
+
+def end_wait(now):
+    wake.set()
+
+
+async def wait_or_shake(ms, grace_ms=0):
+    """
+    Wait `ms` without blocking; a shake (after the first `grace_ms`) ends
+    the wait early. Returns True if a shake ended it.
+    """
+    global skip_after, shake_skipped
+    now = ticks_ms()
+    until = ticks_add(now, ms)
+    wake.clear()
+    shake_skipped = False
+    skip_after = ticks_add(now, grace_ms)
+    display_sched.at(until, "frame", end_wait)
+    await wake.wait()
+    skip_after = None
+    display_sched.cancel(end_wait)
+    if not shake_skipped:
+        game_stats.add(ticks_diff(ticks_ms(), until))
+    return shake_skipped
+
+
+async def sound_finished(sample):
+    """Wait until `sample` has stopped playing (None: return at once)."""
+    while sample is not None and sample_playing(sample):
+        await sleep_until(ticks_add(ticks_ms(), STREAM_POLL_MS))
+
+
+async def imu_task():
+    imu_sched.every(SENSOR_POLL_MS, "imu", sample, ticks_ms())
+    await imu_sched.run_async()
+
+
+async def player_task():
+    await player_sched.run_async(forever=True)
+
+
+def poll_streams(now):
+    sounds.poll(now)
+    if pattern_renderer is not None:
+        pattern_renderer.poll(now)
+
+
+async def display_task():
+    display_sched.every(STREAM_POLL_MS, "audio", poll_streams, ticks_ms())
+    await display_sched.run_async(forever=True)
+
+
+def runtime_report():
+    print("Task lateness:")
+    for sched in (imu_sched, player_sched, display_sched):
+        sched.report()
+        sched.reset_stats()
+    print(" ", game_stats)
+    game_stats.reset()
+    print("Loop periods:")
+    for profile in (play_profile, input_profile):
+        print(" ", profile.summary())
+        profile.reset()
+    print("Memory:")
+    print(" ", gc_guard.summary())
+    gc_guard.reset()
+    print("Audio:")
+    if voices is not None:
+        print(" ", voices.summary())
+        voices.reset()
+    sounds.close_finished()
+    print(" ", sounds.summary())
+    if pattern_renderer is not None:
+        print(" ", pattern_renderer.summary())
+    if feedback_bank is not None:
+        print(" ", feedback_bank.summary())
+        feedback_bank.reset()
+
+
+def profile_loop(profile):
+    """Send the IMU task's sample periods to `profile` (None: stop)."""
+    global loop_profile
+    if profile is not None:
+        profile.restart()
+    loop_profile = profile
 
 # ============================================================
 # RHYTHM GAME LOGIC
 # ============================================================
 
-class Level:
-    def __init__(self, name, pattern):
-        self.name = name
-        self.pattern = pattern  # list of seconds: [0.5, 1.0, 1.5...]
-    
-    def first(self):
-        return self.pattern[0]
-
-    def duration(self):
-        return self.pattern[-1] if self.pattern else 0
-
-LEVELS = [
-    # -------------------------------
-    # EASY: Quarter + light eighths
-    # -------------------------------
-    Level("Level 1",  [0.5, 1.0, 1.5, 2.0]),
-
-    Level("Level 2",  [0.5, 0.75, 1.0, 1.25]),
-
-    Level("Level 3",  [0.25, 0.50, 1.0, 1.25, 1.5]),
-
-    Level("Level 4",  [0.25, 0.50, 1.0, 1.25, 1.75]),
-
-    Level("Level 11 (Swing A)",
-      [0.50, 1.16, 1.66, 2.33, 2.83]),
-    # Swung eighths → long–short–long–short feel
-    # (1.16 ≈ 0.5 + 2/3 beat, 1.66 ≈ 1.16 + 1/2 beat)
-
-    Level("Level 12 (Triplet Clave)",
-        [0.33, 0.66, 1.00, 1.66, 2.33, 2.66]),
-    # Pure triplet grid; extremely musical, very fun
-
-
-    Level("Level 5",  [0.5, 1.50, 1.75, 2.25, 3.0]),
-
-    Level("Level 6",  [0.25, 0.75, 1.25, 1.75, 2.25]),  
-    # “Clap… clap… clapclap… clap” pattern
-
-    Level("Level 14 (3-3-2 Afro Pulse)",
-        [0.33, 0.66, 1.00, 1.66, 2.33, 2.66]),
-    # Classic 3-3-2 rhythmic cell, repeated twice
-
-    Level("Level 15 (Slow–Fast–Fast)",
-        [0.75, 1.25, 1.45, 1.65, 2.15, 2.65, 2.85]),
-
+MIN_SCORE = 80
 
-    Level("Level 7",  [0.50, 1.00, 1.50, 1.75, 2.25, 2.75]),  
-    # Straight quarters → spicy eighth → quarter
+# Round messages go to a RAM ring buffer and are printed between rounds,
+# so USB serial never delays a clap or a hit. INFO (import it from ringlog
+# along with DEBUG) hides the per-beat and per-hit lines.
+LOG_LEVEL = DEBUG
+LOG_SIZE = 64
+log = RingLog(LOG_SIZE, LOG_LEVEL)
 
-    Level("Level 8",  [0.25, 0.50, 0.75, 1.50, 2.00, 2.50]),  
-    # Triplet-ish feel then big spaces
 
-    Level("Level 9",  [0.50, 1.25, 1.50, 2.00, 2.75]),  
-    # Quarter → syncopated pair → quarter → big hit
+def start_pattern(level, loops=1, loop_ms=0):
+    """Play the level's pattern as one sound, from its first beat (see patterns.py)."""
+    play_sample(pattern_renderer.start(level.pattern_ms, loops, loop_ms), "pattern", loop=True)
 
-    Level("Level 10",[0.25, 0.75, 1.00, 1.25, 1.75, 2.25, 2.75]),  
-    # Fun fast 8ths, ends with a clean spaced outro
-    
-    Level("Level 13 (Dotted Quarter Pulse)",
-        [0.50, 2.00, 2.75, 3.25]),
-    # Dotted quarter (1.5s), then tight syncopations
 
-    
+async def run_level(level: Level):
+    """Play rhythm once, record user's shakes, return (score, timing error)."""
+    global listening, hit_count
+    log.info("\n=== Starting {} ===", level.name)
+    profile_loop(play_profile)
+    log.info("Listen to the pattern...")
 
-]
+    pattern = level.pattern
+    duration = level.duration_ms
+    beat_n = 0
+    rendered = pattern_renderer is not None and bool(level.pattern_ms)
 
+    gc_guard.begin_window(duration + 200)
+    play_start = ticks_ms()
+    input_offset = ticks_add(play_start, duration)
 
+    # ---- PLAY THE PATTERN ----
+    def clap(now):
+        nonlocal beat_n
+        play_sound("clap-drum", "pattern")
+        beat_n += 1
+        log.debug("Beat {} at t={:.2f}", beat_n, ticks_diff(now, play_start) / 1000)
+
+    def play_rendered(now):
+        start_pattern(level)
+        log.debug("Pattern started at t={:.2f}", ticks_diff(now, play_start) / 1000)
+
+    if rendered:
+        player_sched.at(ticks_add(play_start, level.first_ms), "pattern", play_rendered, priority=0)
+    else:
+        for beat in level.pattern_ms:
+            player_sched.at(ticks_add(play_start, beat), "beat", clap, priority=0)
+    for beat in level.pattern_ms:
+        events.emit("beat", ticks_add(play_start, beat))
 
-MIN_SCORE = 80
+    # done playing pattern → move to input phase
+    await sleep_until(ticks_add(play_start, duration + 200), game_stats)
 
+    # ---- USER INPUT PHASE ----
+    # Give twice the pattern length to respond
+    input_window = duration * 2
+    gc_guard.begin_window(input_window - 200)
+    log.info("Now you repeat the rhythm...")
+    hit_count = 0
+    listening = True
+    profile_loop(input_profile)
+
+    await sleep_until(ticks_add(play_start, duration + input_window), game_stats)
+    listening = False
+    profile_loop(None)
+    gc_guard.end_window()
+
+    # shakes relative to input phase
+    user_shakes = [ticks_diff(hits[i], input_offset) for i in range(hit_count)]
+    user_shakes = [t for t in user_shakes if t >= 0]  # ignore shakes before input
+    log.debug("User shakes at ms: {}", user_shakes)
 
-def run_level(level: Level):
-    """Play rhythm once, record user's shakes, return score."""
-    print(f"\n=== Starting {level.name} ===")
-    print("Listen to the pattern...")
+    # ---- SCORE (normalized to first user hit) ----
+    expected = len(pattern)
+    score, correct, timing_error, normalized_user = score_hits(level, user_shakes)
 
-    pattern = level.pattern
-    play_start = time.monotonic()
-    play_idx = 0
-    user_shakes = []
+    if len(user_shakes) != expected:
+        log.info("❌ Wrong number of shakes! Expected {}, got {}.", expected, len(user_shakes))
+        log.info("Score: 0% (0/{})", expected)
+        return score, timing_error
 
-    # ---- PLAY THE PATTERN ----
-    while True:
-        now = time.monotonic()
-        elapsed = now - play_start
+    log.debug("User normalized shakes at ms: {}", normalized_user)
+    log.info("Score: {}% ({}/{})", score, correct, expected)
+    log.info("Mean error {:.0f} ms (±{} ms)", timing_error, level.tolerance_ms)
+    return score, timing_error
 
-        # play the next beat in pattern
-        if play_idx < len(pattern) and elapsed >= pattern[play_idx]:
-            play_wav(clap_fp, clap_wav)
-            print(f"Beat {play_idx+1} at t={elapsed:.2f}")
-            play_idx += 1
 
-        # done playing pattern → move to input phase
-        if play_idx == len(pattern) and elapsed >= level.duration() + 0.2:
-            print("Now you repeat the rhythm...")
-            break
+# ============================================================
+# PRACTICE MODE (loop the pattern, play along, instant feedback)
+# ============================================================
 
-        time.sleep(0.005)
+PRACTICE_MODE = False   # True: practice() replaces run_level() in the master loop
+PRACTICE_LOOPS = 4      # times the pattern repeats; the first one is not scored
+FEEDBACK_FLASH_MS = 120  # how long a feedback colour stays on screen
+FLASH_TICK_MS = 10       # how often the display task checks whether it is over
 
-    # ---- USER INPUT PHASE ----
-    input_offset = play_start + level.duration()
-    user_shakes = []
+EARLY_COLOR = 0x0000FF  # azul
+LATE_COLOR = 0xFF8000   # naranja
+ON_TIME_COLOR = 0x00FF00
+MISS_COLOR = 0xFF0000
 
-    while True:
-        now = time.monotonic()
-        elapsed_total = now - play_start
+feedback_palette = displayio.Palette(1)
+feedback_palette[0] = 0x000000
+feedback_tile = displayio.TileGrid(background_bitmap, pixel_shader=feedback_palette)
 
-        # shakes relative to input phase
-        if detect_shake():
-            shake_t = now - input_offset
-            if shake_t >= 0:  # ignore shakes before input
-                user_shakes.append(shake_t)
-                print(f"User shake at t={shake_t:.2f}")
 
-        # Give as much time to respond as the pattern itself + some buffer
-        input_window = level.duration() * 2   # 30% more time than pattern length
+# A hit is handled inside sample(), so this allocates nothing: the result
+# goes to beat_match, and the flash is ended by flash_tick()
+beat_match = [0, 0, 0]  # loop, beat index, signed error (ms)
+flash_until = None      # ticks at which the feedback colour goes off
 
-        if elapsed_total >= level.duration() + input_window:
-            break
 
-        time.sleep(0.005)
+def nearest_beat(pattern, loop_len, t):
+    """Put (loop, beat index, signed error) of the beat closest to time t (ms) in beat_match."""
+    k = t // loop_len
+    best = -1
+    for loop in range(max(k - 1, 0), k + 2):
+        base = loop * loop_len
+        for i in range(len(pattern)):
+            err = t - (base + pattern[i])
+            if best < 0 or abs(err) < best:
+                best = abs(err)
+                beat_match[0] = loop
+                beat_match[1] = i
+                beat_match[2] = err
 
 
-    # ---- SCORE (normalized to first user hit) ----
+def flash_tick(now):
+    global flash_until
+    if flash_until is not None and ticks_diff(now, flash_until) >= 0:
+        feedback_palette[0] = 0x000000
+        flash_until = None
 
-    # 1) CHECK COUNT FIRST (hard fail)
-    expected = len(pattern)
-    actual = len(user_shakes)
 
-    if actual != expected:
-        print(f"❌ Wrong number of shakes! Expected {expected}, got {actual}.")
-        print(f"Score: 0% (0/{expected})")
-        return 0
+async def practice(level: Level, loops=PRACTICE_LOOPS):
+    """
+    Loop the pattern while the player claps along.
+    The player task plays the claps while the IMU task listens, and every
+    hit flashes early / on time / late right away. Returns (score, timing
+    error) over the loops after the first one.
+    """
+    global listening, hit_handler, hit_count
+    log.info("\n=== Practice: {} x{} ===", level.name, loops)
 
-    # 2) Normal case: compute timing alignment
-    offset = user_shakes[0] - level.first()
-    normalized_user = [t - offset for t in user_shakes]
+    pattern = level.pattern_ms
+    tolerance = level.tolerance_ms
+    # Leave the same lead-in before each repeat as before the first beat
+    loop_len = level.duration_ms + level.first_ms
+    total_len = loop_len * loops
 
-    print("User normalized shakes:", ["{:.2f}".format(t) for t in normalized_user])
+    splash.append(feedback_tile)
+    feedback_palette[0] = 0x000000
 
-    used = set()
+    claimed = bytearray(loops * len(pattern))   # 1: that beat of that loop was hit
     correct = 0
-
-
-    for beat in pattern:
-        best_idx = None
-        best_diff = 0.1  # tolerance
-
-        for i, t in enumerate(normalized_user):
-            if i in used:
-                continue
-            diff = abs(t - beat)
-            if diff <= best_diff:
-                best_diff = diff
-                best_idx = i
-
-        if best_idx is not None:
-            used.add(best_idx)
+    total_error = 0
+    early = late = 0
+    worst_feedback = 0
+    rendered = pattern_renderer is not None and bool(pattern)
+
+    gc_guard.begin_window(total_len + tolerance)
+    start_t = ticks_ms()
+
+    # ---- PATTERN PLAYBACK ----
+    def clap(now):
+        play_sound("clap-drum", "pattern")
+
+    def play_rendered(now):
+        start_pattern(level, loops, loop_len)   # every loop in one sound
+
+    if rendered:
+        player_sched.at(ticks_add(start_t, level.first_ms), "pattern", play_rendered, priority=0)
+    for loop in range(loops):
+        for beat in pattern:
+            events.emit("beat", ticks_add(start_t, loop * loop_len + beat))
+            if not rendered:
+                player_sched.at(ticks_add(start_t, loop * loop_len + beat), "beat", clap,
+                                priority=0)
+
+    # ---- PLAYER INPUT + IMMEDIATE FEEDBACK ----
+    def on_hit(now):
+        global flash_until
+        nonlocal correct, total_error, early, late, worst_feedback
+        nearest_beat(pattern, loop_len, ticks_diff(now, start_t))
+        hit_loop = beat_match[0]
+        hit_i = beat_match[1]
+        err = beat_match[2]
+        if abs(err) > tolerance:
+            color = MISS_COLOR
+        elif abs(err) <= tolerance // 2:
+            color = ON_TIME_COLOR
+        elif err < 0:
+            color = EARLY_COLOR
+        else:
+            color = LATE_COLOR
+        feedback_palette[0] = color
+        flash_until = ticks_add(now, FEEDBACK_FLASH_MS)
+        worst_feedback = max(worst_feedback, ticks_diff(ticks_ms(), now))
+        log.debug("Hit: beat {} of loop {}, {} ms", hit_i + 1, hit_loop + 1, err)
+
+        # Score everything after the first (listening) loop
+        slot = hit_loop * len(pattern) + hit_i
+        if 1 <= hit_loop < loops and abs(err) <= tolerance and not claimed[slot]:
+            claimed[slot] = 1
             correct += 1
-
-    score = int(100 * correct / len(pattern))
-    print(f"Score: {score}% ({correct}/{len(pattern)})")
-    return score
+            total_error += abs(err)
+            if err < 0:
+                early += 1
+            else:
+                late += 1
+
+    hit_count = 0
+    hit_handler = on_hit
+    listening = True
+    profile_loop(input_profile)
+    display_sched.every(FLASH_TICK_MS, "frame", flash_tick, start_t)
+    await sleep_until(ticks_add(start_t, total_len + tolerance), game_stats)
+    listening = False
+    hit_handler = None
+    profile_loop(None)
+    display_sched.cancel(flash_tick)
+    gc_guard.end_window()
+
+    feedback_palette[0] = 0x000000
+    splash.remove(feedback_tile)
+
+    scored_beats = len(pattern) * (loops - 1)
+    if scored_beats <= 0:
+        return 0, tolerance
+    missed = scored_beats - correct
+    score = int(100 * correct / scored_beats)
+    timing_error = (total_error + missed * tolerance) / scored_beats
+    log.info("Practice score: {}% ({}/{})", score, correct, scored_beats)
+    log.info("Early {}, late {}", early, late)
+    log.info("Mean error {:.0f} ms, worst feedback delay {} ms", timing_error, worst_feedback)
+    return score, timing_error
 
 
 # ============================================================
 # MASTER GAME LOOP
 # ============================================================
 
-current_level = 0
-
-play_wav(go_fp, go_wav)
+async def game_task():
+    selector = DifficultySelector(LEVELS, min_gap_ms=shake_detector.cooldown_ms,
+                                  vary=not PRACTICE_MODE)
+    current_level = selector.next_level()
 
-while True:
-    level = LEVELS[current_level]
-    
-    score = run_level(level)
+    await sound_finished(play_sound("go"))
 
-    if score >= MIN_SCORE:
-        play_wav(success_fp, success_wav)
-        success(3)
-        print(f"🎉 SUCCESS! Advancing to next level.\n")
-        
-        current_level = (current_level + 1) % len(LEVELS)
-        play_wav(go_fp, go_wav)
-    else:
-        play_wav(fail_fp, fail_wav)
-        failure(3)
-        print("❌ FAILED — try again.\n")
-        play_wav(go_fp, go_wav)
-
-    time.sleep(1.0)
+    while True:
+        level = LEVELS[current_level]
+
+        if PRACTICE_MODE:
+            score, timing_error = await practice(level)
+        else:
+            score, timing_error = await run_level(level)
+        passed = score >= MIN_SCORE
+        log.flush()
+        runtime_report()
+        events.emit("round_end", score)
+
+        # Model the player and pick what comes next (retry or move on)
+        selector.update(current_level, score, timing_error, level.tolerance_ms, passed)
+        current_level = selector.next_level()
+
+        # Result screens and the pause after them end early on a shake
+        if passed:
+            play_sound("success")
+            skipped = await success(3)
+            print(f"🎉 SUCCESS! Next up: {LEVELS[current_level].name}\n")
+        else:
+            play_sound("fail")
+            skipped = await failure(3)
+            print(f"❌ FAILED — Next up: {LEVELS[current_level].name}\n")
+
+        # The next pattern starts once "go" is over, skipped or not
+        go = play_sound("go")
+        if skipped:
+            print("(skipped)")
+        else:
+            await wait_or_shake(1000)
+        await sound_finished(go)
+
+
+async def main():
+    asyncio.create_task(imu_task())
+    asyncio.create_task(player_task())
+    asyncio.create_task(display_task())
+    await game_task()
+
+
+boot_trace.mark("runtime setup")
+boot_trace.finish()
+asyncio.run(main())
@@ -0,0 +1,92 @@
+# ------------------------------------------------------------
+# SHAKE DETECTOR
+# ------------------------------------------------------------
+#
+# Plain Python (no hardware imports): code.py feeds it live IMU readings,
+# host tools feed it simulated traces, and both get identical decisions.
+
+import math
+
+from timebase import ticks_diff
+
+GRAVITY = 9.8
+
+COOLDOWN_MS = 250
+FILTER_ALPHA = 0.30
+
+# Calibration peaks below these mean the baton was not really struck
+# (resting on a table, just picked up)
+CALIBRATION_MIN_ACCEL_G = 1.0
+CALIBRATION_MIN_GYRO = 4.0
+
+
+def motion_magnitudes(ax, ay, az, gx, gy, gz):
+    """(extra acceleration in g above gravity, angular speed in rad/s)."""
+    accel_mag = math.sqrt(ax*ax + ay*ay + az*az)
+    accel_extra = max(0, (accel_mag - GRAVITY)/GRAVITY)
+    gyro_mag = math.sqrt(gx*gx + gy*gy + gz*gz)
+    return accel_extra, gyro_mag
+
+
+def thresholds_from_peaks(max_acc_g, max_gyro):
+    """Detection thresholds from the peaks seen during calibration."""
+    accel_th = max(0.8, max_acc_g * 0.35)
+    gyro_th = max(3.0, max_gyro * 0.45)
+    return accel_th, gyro_th
+
+
+def enough_motion(max_acc_g, max_gyro):
+    """True if calibration peaks this high come from real strikes."""
+    return max_acc_g >= CALIBRATION_MIN_ACCEL_G and max_gyro >= CALIBRATION_MIN_GYRO
+
+
+class ShakeDetector:
+    """Low-pass filtered accel/gyro thresholds with a cooldown."""
+
+    def __init__(self, accel_th, gyro_th, cooldown_ms=COOLDOWN_MS, alpha=FILTER_ALPHA):
+        self.accel_th = accel_th
+        self.gyro_th = gyro_th
+        self.cooldown_ms = cooldown_ms
+        self.alpha = alpha
+        self.reset()
+
+    def reset(self):
+        self.accel_f = 0
+        self.gyro_f = 0
+        self.last_shake_time = None  # ticks of the last shake
+        self.strength = 0.0          # of the last shake, see update_motion()
+
+    def update(self, ax, ay, az, gx, gy, gz, now):
+        """Feed one IMU sample taken at `now` (ticks). True exactly when a shake happens."""
+        accel_extra, gyro_mag = motion_magnitudes(ax, ay, az, gx, gy, gz)
+        return self.update_motion(accel_extra, gyro_mag, now)
+
+    def update_motion(self, accel_extra, gyro_mag, now):
+        """update() for magnitudes already computed (allocation-free path)."""
+        # filtering
+        alpha = self.alpha
+        accel_prev = self.accel_f
+        gyro_prev = self.gyro_f
+        self.accel_f = accel_prev*(1-alpha) + accel_extra*alpha
+        self.gyro_f = gyro_prev*(1-alpha) + gyro_mag*alpha
+
+        shake = (self.accel_f > self.accel_th) or (self.gyro_f > self.gyro_th)
+        last = self.last_shake_time
+        if last is not None and not 0 <= ticks_diff(now, last) <= self.cooldown_ms:
+            # Cooldown over: forget the shake, so an idle gap longer than
+            # half the tick period (~3.1 days) cannot wrap ticks_diff
+            # negative and keep rejecting shakes
+            last = self.last_shake_time = None
+
+        if shake and last is None:
+            self.last_shake_time = now
+            # Strength: how much the filtered signal rose over this sample,
+            # in thresholds. The peak comes later (usually the swing is
+            # detected before the impact), but a harder strike crosses the
+            # threshold on a steeper edge.
+            accel_rise = (self.accel_f - accel_prev) / self.accel_th
+            gyro_rise = (self.gyro_f - gyro_prev) / self.gyro_th
+            self.strength = accel_rise if accel_rise > gyro_rise else gyro_rise
+            return True
+
+        return False
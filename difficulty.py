@@ -0,0 +1,208 @@
+# ------------------------------------------------------------
+# ADAPTIVE DIFFICULTY SELECTION
+# ------------------------------------------------------------
+#
+# Models the player's skill from recent scores and timing errors and
+# picks the next level so the pass rate stays near PASS_TARGET.
+#
+# Levels are ranked once by an intrinsic difficulty estimate (beat count,
+# density and the tightest gap). Skill lives on the same rank scale: the
+# chance of passing a level is modelled as
+#
+#     p = 1 / (1 + exp(-(skill - rank) / SKILL_SCALE))
+#
+# The next level is drawn at random from the ranks within NEAR_RANKS of
+# the one the model aims at, so a strong player does not get the hardest
+# level over and over. A level just failed is tried again while it stays
+# in that window; one just passed is not drawn again (unless vary=False,
+# as in practice mode). Levels with a gap shorter than the detector's
+# cooldown (min_gap_ms) cannot be played cleanly and are never picked.
+#
+# Every round is an O(1) update of a handful of floats, and the state is
+# stored in microcontroller.nvm so it survives power cycles. NVM is flash
+# (good for tens of thousands of erases), so it is written only when skill
+# or bias has moved by SAVE_MIN_CHANGE, and at most every SAVE_MIN_ROUNDS
+# rounds: with a round every ~10 s, under 200 writes a day.
+
+import math
+import random
+import struct
+
+try:
+    import microcontroller
+except ImportError:
+    microcontroller = None
+
+PASS_TARGET = 0.70     # pass rate we try to keep the player at
+SKILL_SCALE = 1.5      # ranks per logistic unit
+SKILL_RATE = 2.0       # step size of the skill update (ranks)
+BIAS_RATE = 0.5        # step size of the pass-rate correction
+PASS_SMOOTHING = 0.2   # EWMA factor for the observed pass rate
+NEAR_RANKS = 1         # ranks either side of the target the next level is drawn from
+SAVE_MIN_ROUNDS = 50   # rounds between NVM writes, at least
+SAVE_MIN_CHANGE = 0.5  # ranks skill or bias must move before it is saved again
+
+NVM_OFFSET = 0
+_NVM_MAGIC = 0x5244    # "RD"
+_NVM_FORMAT = "<HfffH"  # magic, skill, bias, pass_rate, rounds
+_NVM_SIZE = struct.calcsize(_NVM_FORMAT)
+
+
+def level_difficulty(pattern):
+    """Intrinsic difficulty of a beat pattern (bigger is harder)."""
+    if not pattern:
+        return 0.0
+    gaps = [b - a for a, b in zip(pattern, pattern[1:])]
+    tightest = min(gaps) if gaps else 1.0
+    density = len(pattern) / max(pattern[-1], 0.25)
+    # distinct gap lengths (10 ms buckets) ~ how irregular the rhythm is
+    shapes = len(set(int(g * 100 + 0.5) for g in gaps))
+    return len(pattern) + density + 0.5 / max(tightest, 0.05) + shapes
+
+
+def _sigmoid(x):
+    if x < -30:
+        return 0.0
+    if x > 30:
+        return 1.0
+    return 1.0 / (1.0 + math.exp(-x))
+
+
+class DifficultySelector:
+    """Online skill model that chooses the next level index."""
+
+    def __init__(self, levels, target=PASS_TARGET, min_gap_ms=0, vary=True):
+        """
+        min_gap_ms: levels with a shorter gap between beats are left out.
+        vary: never follow a passed level with itself.
+        """
+        self.target = target
+        self.vary = vary
+        self.last = None    # index of the level picked last
+        self.last_passed = False
+
+        # Rank the playable levels once: order[rank] -> index in levels,
+        # rank_of[index] -> rank (left-out levels rank above the hardest)
+        playable = [i for i, level in enumerate(levels) if level.min_ioi_ms >= min_gap_ms]
+        if not playable:
+            playable = list(range(len(levels)))
+        scores = [level_difficulty(level.pattern) for level in levels]
+        self.order = sorted(playable, key=lambda i: scores[i])
+        self.rank_of = [len(self.order)] * len(levels)
+        for rank, idx in enumerate(self.order):
+            self.rank_of[idx] = rank
+
+        # Rank offset at which the model predicts exactly `target`
+        self._target_offset = SKILL_SCALE * math.log(target / (1.0 - target))
+
+        self.reset(save=False)
+        self.load()
+
+    def expected_pass(self, index):
+        """Predicted chance of passing LEVELS[index]."""
+        return _sigmoid((self.skill - self.rank_of[index]) / SKILL_SCALE)
+
+    def update(self, index, score, timing_error, tolerance, passed):
+        """Fold one round into the model. O(1)."""
+        # Performance in [0, 1]: half pass/fail, half score discounted by
+        # how loose the hits were
+        outcome = 1.0 if passed else 0.0
+        looseness = min(1.0, timing_error / tolerance) if tolerance > 0 else 0.0
+        quality = (score / 100) * (1.0 - 0.5 * looseness)
+        performance = 0.5 * outcome + 0.5 * quality
+
+        self.skill += SKILL_RATE * (performance - self.expected_pass(index))
+        self.skill = min(max(self.skill, -SKILL_SCALE), len(self.order) + SKILL_SCALE)
+
+        # Integral correction: passing too often pushes levels harder
+        self.pass_rate += PASS_SMOOTHING * (outcome - self.pass_rate)
+        self.bias += BIAS_RATE * PASS_SMOOTHING * (self.pass_rate - self.target)
+        self.bias = min(max(self.bias, -SKILL_SCALE * 2), SKILL_SCALE * 2)
+
+        self.last = index
+        self.last_passed = passed
+        self.rounds += 1
+        if self._worth_saving():
+            self.save()
+
+    def _worth_saving(self):
+        if self.rounds - self._saved_rounds < SAVE_MIN_ROUNDS:
+            return False
+        return (abs(self.skill - self._saved_skill) >= SAVE_MIN_CHANGE
+                or abs(self.bias - self._saved_bias) >= SAVE_MIN_CHANGE)
+
+    def next_level(self):
+        """
+        Index of a level near the one whose predicted pass chance is
+        closest to target: the last one again if it was failed, another
+        one if it was passed.
+        """
+        top = len(self.order) - 1
+        rank = int(self.skill + self.bias - self._target_offset + 0.5)
+        rank = min(max(rank, 0), top)
+        # A full window of ranks, shifted inwards at the easy and hard ends
+        low = max(min(rank - NEAR_RANKS, top - 2 * NEAR_RANKS), 0)
+        high = min(low + 2 * NEAR_RANKS, top)
+        window = self.order[low:high + 1]
+        if self.last in window and not self.last_passed:
+            return self.last
+        if self.vary:
+            window = [idx for idx in window if idx != self.last]
+        return random.choice(window) if window else self.order[rank]
+
+    # ---------------- persistence ----------------
+
+    def load(self):
+        nvm = _nvm()
+        if nvm is None or len(nvm) < NVM_OFFSET + _NVM_SIZE:
+            return
+        try:
+            magic, skill, bias, pass_rate, rounds = struct.unpack(
+                _NVM_FORMAT, bytes(nvm[NVM_OFFSET:NVM_OFFSET + _NVM_SIZE])
+            )
+        except Exception as e:
+            print("Difficulty state unreadable:", e)
+            return
+        if magic != _NVM_MAGIC or skill != skill or bias != bias:  # NaN check
+            return
+        self.skill = skill
+        self.bias = bias
+        self.pass_rate = pass_rate
+        self.rounds = rounds
+        self._mark_saved()
+        print(f"Restored skill {skill:.2f} after {rounds} rounds")
+
+    def save(self):
+        nvm = _nvm()
+        if nvm is None or len(nvm) < NVM_OFFSET + _NVM_SIZE:
+            return
+        data = struct.pack(
+            _NVM_FORMAT, _NVM_MAGIC, self.skill, self.bias,
+            self.pass_rate, self.rounds & 0xFFFF
+        )
+        self._mark_saved()
+        # Only touch flash when the model changed (the round count alone
+        # is not worth an erase)
+        if bytes(nvm[NVM_OFFSET:NVM_OFFSET + _NVM_SIZE - 2]) != data[:-2]:
+            nvm[NVM_OFFSET:NVM_OFFSET + _NVM_SIZE] = data
+
+    def _mark_saved(self):
+        self._saved_skill = self.skill
+        self._saved_bias = self.bias
+        self._saved_rounds = self.rounds
+
+    def reset(self, save=True):
+        """Forget the player: start again from the easiest level."""
+        self.skill = self._target_offset
+        self.bias = 0.0
+        self.pass_rate = self.target
+        self.rounds = 0
+        self._mark_saved()
+        if save:
+            self.save()
+
+
+def _nvm():
+    if microcontroller is None:
+        return None
+    return getattr(microcontroller, "nvm", None)
@@ -0,0 +1,22 @@
+# ------------------------------------------------------------
+# GAME EVENTS
+# ------------------------------------------------------------
+#
+# code.py reports a few milestones here, so tools can follow a session
+# without depending on its log text or patching its classes:
+#
+#     "beat"       a clap was scheduled; value: its deadline (ticks)
+#     "shake"      the detector fired; value: ticks of the IMU read
+#     "round_end"  a round was scored and reported; value: the score
+#
+# On the board nothing listens: emit() is one test of 'hook'. A tool sets
+# events.hook = callback(name, value) after importing this module and
+# before running code.py. emit() takes one value, so reporting a shake
+# from the sampling path allocates nothing.
+
+hook = None
+
+
+def emit(name, value=None):
+    if hook is not None:
+        hook(name, value)
@@ -0,0 +1,66 @@
+# ------------------------------------------------------------
+# STRIKE-STRENGTH FEEDBACK
+# ------------------------------------------------------------
+#
+# The hit feedback follows how hard the baton was struck: a soft strike
+# gets a quiet beat, a hard one the full beat. Scaling the audio on each
+# hit would mean a new buffer and a loop over every sample inside the IMU
+# sampling path, so FeedbackBank scales the beat once at load into a few
+# RawSamples, one per gain, and a hit only picks one:
+#
+#     bank = FeedbackBank(sounds.pcm["beat"], 16000)
+#     voices.play(bank.pick(shake_detector.strength), "feedback")
+#
+# strength is ShakeDetector.strength: how far the filtered signal rose
+# through the sample that detected the hit, in thresholds (~0.1 for a
+# gentle strike at SENSOR_POLL_MS = 5, ~0.2 for a firm one). Strengths up
+# to SOFT_STRENGTH get the quietest variant, FULL_STRENGTH and up the
+# loudest, with the others in between. pick() allocates nothing.
+
+from audiocore import RawSample
+
+from buffers import zeros
+
+GAINS = (0.4, 0.6, 0.8, 1.0)   # quietest to loudest; 1.0 shares the beat's own buffer
+SOFT_STRENGTH = 0.05
+FULL_STRENGTH = 0.25
+
+
+def _scaled(samples, gain):
+    out = zeros(len(samples))
+    for i in range(len(samples)):
+        out[i] = int(samples[i] * gain)
+    return out
+
+
+class FeedbackBank:
+    def __init__(self, samples, sample_rate, gains=GAINS,
+                 soft=SOFT_STRENGTH, full=FULL_STRENGTH):
+        """samples: the beat's audio, array('h'), mono at sample_rate."""
+        self.gains = gains
+        self.samples = []
+        for gain in gains:
+            pcm = samples if gain == 1.0 else _scaled(samples, gain)
+            self.samples.append(RawSample(pcm, channel_count=1, sample_rate=sample_rate))
+        self.soft = soft
+        self.step = (len(gains) - 1) / (full - soft)   # variants per unit of strength
+        self.nbytes = 2 * len(samples) * sum(1 for gain in gains if gain != 1.0)
+        self.picks = [0] * len(gains)   # hits per variant since reset()
+
+    def reset(self):
+        for i in range(len(self.picks)):
+            self.picks[i] = 0
+
+    def pick(self, strength):
+        """The variant for a hit of this strength."""
+        i = int((strength - self.soft) * self.step)
+        if i < 0:
+            i = 0
+        elif i >= len(self.samples):
+            i = len(self.samples) - 1
+        self.picks[i] += 1
+        return self.samples[i]
+
+    def summary(self):
+        counts = " ".join(f"{gain:.1f}:{n}" for gain, n in zip(self.gains, self.picks))
+        return f"feedback picks {counts} ({self.nbytes // 1024} KB)"
@@ -0,0 +1,121 @@
+# ------------------------------------------------------------
+# GC AROUND TIMING WINDOWS
+# ------------------------------------------------------------
+#
+# An automatic garbage collection in the middle of the input phase stalls
+# the IMU task, so the hit being sampled gets a late timestamp. Instead:
+#
+#   begin_window(ms)  collect now (timed), then hold off automatic GC for
+#                     the window if the heap has room for it
+#   sample(now)       once per IMU sample inside the window: spots
+#                     collections that still happened and how late that
+#                     sample (a hit timestamp) was
+#   end_window()      re-enable automatic GC
+#
+# Headroom check: the allocation rate of earlier windows (bytes per ms,
+# from gc.mem_free()) times the window length, with a safety factor, must
+# fit in the free heap. With automatic GC disabled a full heap raises
+# MemoryError instead of collecting, so until a rate has been measured the
+# window runs with GC enabled. On host Python (no gc.mem_free) GC is never
+# held off.
+
+import gc
+
+from timebase import ticks_diff, ticks_ms
+
+HEADROOM_FACTOR = 2      # free heap must cover this many windows' worth of allocations
+MIN_HEADROOM = 4096      # bytes kept free no matter how little a window allocates
+
+_mem_free = getattr(gc, "mem_free", None)
+
+
+class GCGuard:
+    def __init__(self, period_ms):
+        self.period_ms = period_ms  # expected ms between sample() calls
+        self.rate = None            # bytes allocated per ms in a window (worst seen)
+        self.held = False
+        self.reset()
+
+    def reset(self):
+        self.collects = 0
+        self.pause_total = 0
+        self.pause_worst = 0
+        self.windows = 0
+        self.held_windows = 0
+        self.auto = 0               # automatic collections inside windows
+        self.auto_delay_worst = 0   # worst extra delay of a sample right after one
+        self._start = None
+        self._start_free = None
+        self._free = None
+        self._last = None
+        self._collected = False
+
+    def collect(self):
+        """gc.collect(), timed."""
+        start = ticks_ms()
+        gc.collect()
+        pause = ticks_diff(ticks_ms(), start)
+        self.collects += 1
+        self.pause_total += pause
+        if pause > self.pause_worst:
+            self.pause_worst = pause
+        return pause
+
+    def begin_window(self, window_ms):
+        self.end_window()
+        self.collect()
+        self.windows += 1
+        self._start = ticks_ms()
+        self._last = None
+        self._collected = False
+        if _mem_free is None:
+            return
+        free = self._start_free = self._free = _mem_free()
+        if self.rate is not None:
+            needed = max(MIN_HEADROOM, self.rate * window_ms * HEADROOM_FACTOR)
+            if free >= needed:
+                gc.disable()
+                self.held = True
+                self.held_windows += 1
+
+    def end_window(self):
+        if self.held:
+            gc.enable()
+            self.held = False
+        if self._start is None:
+            return
+        if self._start_free is not None and not self._collected:
+            # Only a window without a collection shows what it allocated
+            elapsed = ticks_diff(ticks_ms(), self._start)
+            if elapsed > 0:
+                rate = (self._start_free - _mem_free()) / elapsed
+                if self.rate is None or rate > self.rate:
+                    self.rate = rate
+        self._start = None
+        self._start_free = None
+
+    def sample(self, now):
+        if self._start is None or _mem_free is None:
+            return
+        last = self._last
+        self._last = now
+        free = _mem_free()
+        if free > self._free:
+            # the heap grew back: a collection ran since the last sample
+            self._collected = True
+            self.auto += 1
+            if last is not None:
+                delay = ticks_diff(now, last) - self.period_ms
+                if delay > self.auto_delay_worst:
+                    self.auto_delay_worst = delay
+        self._free = free
+
+    def summary(self):
+        mean = self.pause_total / self.collects if self.collects else 0.0
+        rate = "?" if self.rate is None else f"{self.rate:.1f}"
+        free = "?" if _mem_free is None else _mem_free()
+        return (f"gc     collects={self.collects} pause mean={mean:.1f} ms "
+                f"worst={self.pause_worst} ms, windows={self.windows} "
+                f"held={self.held_windows}, auto in window={self.auto} "
+                f"(worst hit delay +{self.auto_delay_worst} ms), "
+                f"alloc={rate} B/ms, free={free} B")
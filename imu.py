@@ -0,0 +1,58 @@
+# ------------------------------------------------------------
+# ALLOCATION-FREE IMU READS
+# ------------------------------------------------------------
+#
+# icm.acceleration and icm.gyro each select the register bank, read
+# through a Struct and return a new tuple of floats: several I2C
+# transactions and heap allocations per sample. BurstReader reads accel +
+# gyro (12 consecutive registers) in one transaction into a preallocated
+# buffer and keeps the two magnitudes the shake detector needs as
+# attributes, so a sample allocates nothing.
+#
+# Plain Python: it only needs an object with write_then_readinto()
+# (the driver's i2c_device, or a fake on a computer). The register bank
+# must already be 0, which is where the ICM20x driver leaves it.
+
+import math
+
+from detector import GRAVITY
+
+ACCEL_XOUT_H = 0x2D   # accel X/Y/Z then gyro X/Y/Z, big-endian int16
+STANDARD_GRAVITY = 9.80665
+RAD_PER_DEG = 0.017453293
+
+
+def _s16(high, low):
+    value = (high << 8) | low
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class BurstReader:
+    def __init__(self, i2c_device, accel_lsb_per_g, gyro_lsb_per_dps):
+        self.device = i2c_device
+        self.register = bytearray((ACCEL_XOUT_H,))
+        self.buffer = bytearray(12)
+        self.accel_scale = STANDARD_GRAVITY / accel_lsb_per_g   # m/s^2 per LSB
+        self.gyro_scale = RAD_PER_DEG / gyro_lsb_per_dps        # rad/s per LSB
+        self.accel_extra = 0.0   # g above gravity, as motion_magnitudes()
+        self.gyro_mag = 0.0      # rad/s
+
+    def read(self):
+        """One burst read; updates accel_extra and gyro_mag."""
+        with self.device as device:
+            device.write_then_readinto(self.register, self.buffer)
+        b = self.buffer
+
+        # Scale before squaring: squares of raw int16 overflow small ints
+        scale = self.accel_scale
+        x = _s16(b[0], b[1]) * scale
+        y = _s16(b[2], b[3]) * scale
+        z = _s16(b[4], b[5]) * scale
+        accel_mag = math.sqrt(x*x + y*y + z*z)
+        self.accel_extra = max(0, (accel_mag - GRAVITY)/GRAVITY)
+
+        scale = self.gyro_scale
+        x = _s16(b[6], b[7]) * scale
+        y = _s16(b[8], b[9]) * scale
+        z = _s16(b[10], b[11]) * scale
+        self.gyro_mag = math.sqrt(x*x + y*y + z*z)
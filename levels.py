@@ -0,0 +1,157 @@
+# ------------------------------------------------------------
+# LEVELS AND SCORING
+# ------------------------------------------------------------
+#
+# Plain Python (no hardware imports) so host tools can load the same
+# patterns and grade hits exactly like the game does.
+#
+# Patterns are written in seconds; everything the game computes with is
+# the integer-millisecond copy made at load (see timebase.py).
+
+from timebase import seconds_to_ms
+
+# Hit tolerance is derived per level from the tightest gap in its pattern:
+# a fraction of the minimum inter-onset interval (so neighbouring beats
+# never share a hit), clamped, plus the sensor loop period measured at
+# calibration (a hit can be timestamped up to one poll late).
+TOLERANCE_FRACTION = 0.4
+MIN_TOLERANCE_MS = 60
+MAX_TOLERANCE_MS = 150
+DEFAULT_TOLERANCE_MS = 100
+
+
+class Level:
+    def __init__(self, name, pattern):
+        self.name = name
+        self.pattern = pattern  # list of seconds: [0.5, 1.0, 1.5...]
+
+        self.pattern_ms = [seconds_to_ms(t) for t in pattern]
+        self.first_ms = self.pattern_ms[0] if pattern else 0
+        self.duration_ms = self.pattern_ms[-1] if pattern else 0
+        gaps = [b - a for a, b in zip(self.pattern_ms, self.pattern_ms[1:])]
+        self.min_ioi_ms = min(gaps) if gaps else 0
+        self.tolerance_ms = DEFAULT_TOLERANCE_MS
+
+    def set_sensor_latency(self, latency_ms):
+        """Precompute this level's hit tolerance (ms, either side)."""
+        if self.min_ioi_ms <= 0:
+            self.tolerance_ms = MAX_TOLERANCE_MS + latency_ms
+            return
+        tol = self.min_ioi_ms * TOLERANCE_FRACTION
+        tol = int(min(max(tol, MIN_TOLERANCE_MS), MAX_TOLERANCE_MS) + latency_ms)
+        # never let two neighbouring beats claim the same hit
+        self.tolerance_ms = min(tol, self.min_ioi_ms // 2)
+
+    def first(self):
+        return self.pattern[0]
+
+    def duration(self):
+        return self.pattern[-1] if self.pattern else 0
+
+LEVELS = [
+    # -------------------------------
+    # EASY: Quarter + light eighths
+    # -------------------------------
+    Level("Level 1",  [0.5, 1.0, 1.5, 2.0]),
+
+    Level("Level 2",  [0.5, 0.75, 1.0, 1.25]),
+
+    Level("Level 3",  [0.25, 0.50, 1.0, 1.25, 1.5]),
+
+    Level("Level 4",  [0.25, 0.50, 1.0, 1.25, 1.75]),
+
+    Level("Level 11 (Swing A)",
+      [0.50, 1.16, 1.66, 2.33, 2.83]),
+    # Swung eighths → long–short–long–short feel
+    # (1.16 ≈ 0.5 + 2/3 beat, 1.66 ≈ 1.16 + 1/2 beat)
+
+    Level("Level 12 (Triplet Clave)",
+        [0.33, 0.66, 1.00, 1.66, 2.33, 2.66]),
+    # Pure triplet grid; extremely musical, very fun
+
+
+    Level("Level 5",  [0.5, 1.50, 1.75, 2.25, 3.0]),
+
+    Level("Level 6",  [0.25, 0.75, 1.25, 1.75, 2.25]),  
+    # “Clap… clap… clapclap… clap” pattern
+
+    Level("Level 14 (3-3-2 Afro Pulse)",
+        [0.33, 0.66, 1.00, 1.66, 2.33, 2.66]),
+    # Classic 3-3-2 rhythmic cell, repeated twice
+
+    Level("Level 15 (Slow–Fast–Fast)",
+        [0.75, 1.25, 1.45, 1.65, 2.15, 2.65, 2.85]),
+
+
+    Level("Level 7",  [0.50, 1.00, 1.50, 1.75, 2.25, 2.75]),  
+    # Straight quarters → spicy eighth → quarter
+
+    Level("Level 8",  [0.25, 0.50, 0.75, 1.50, 2.00, 2.50]),  
+    # Triplet-ish feel then big spaces
+
+    Level("Level 9",  [0.50, 1.25, 1.50, 2.00, 2.75]),  
+    # Quarter → syncopated pair → quarter → big hit
+
+    Level("Level 10",[0.25, 0.75, 1.00, 1.25, 1.75, 2.25, 2.75]),  
+    # Fun fast 8ths, ends with a clean spaced outro
+    
+    Level("Level 13 (Dotted Quarter Pulse)",
+        [0.50, 2.00, 2.75, 3.25]),
+    # Dotted quarter (1.5s), then tight syncopations
+
+    
+
+]
+
+
+def prepare_levels(levels, sensor_latency_ms):
+    """Precompute every level's tolerance once the sensor loop is measured."""
+    for level in levels:
+        level.set_sensor_latency(sensor_latency_ms)
+
+
+def score_hits(level, user_shakes):
+    """
+    Grade hits (ms since the input phase started) against a level.
+
+    Hits are normalized to the first one, then each beat takes the closest
+    unused hit within the level's tolerance.
+    Returns (score %, correct beats, mean timing error in ms, normalized hits).
+    A missed beat counts as a full tolerance of error.
+    """
+    pattern = level.pattern_ms
+    tolerance = level.tolerance_ms
+
+    # 1) CHECK COUNT FIRST (hard fail)
+    if len(user_shakes) != len(pattern):
+        return 0, 0, tolerance, []
+
+    # 2) Normal case: compute timing alignment
+    offset = user_shakes[0] - level.first_ms
+    normalized_user = [t - offset for t in user_shakes]
+
+    used = set()
+    correct = 0
+    total_error = 0
+
+    for beat in pattern:
+        best_idx = None
+        best_diff = tolerance
+
+        for i, t in enumerate(normalized_user):
+            if i in used:
+                continue
+            diff = abs(t - beat)
+            if diff <= best_diff:
+                best_diff = diff
+                best_idx = i
+
+        if best_idx is not None:
+            used.add(best_idx)
+            correct += 1
+            total_error += best_diff
+        else:
+            total_error += tolerance
+
+    score = int(100 * correct / len(pattern))
+    return score, correct, total_error / len(pattern), normalized_user
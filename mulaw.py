@@ -0,0 +1,91 @@
+# ------------------------------------------------------------
+# μ-LAW SOUNDS
+# ------------------------------------------------------------
+#
+# boot, success and fail are long: as 16-bit PCM they take ~300 KB of the
+# CIRCUITPY drive, and a streamed WAV reads 32 KB of flash per second of
+# playback. G.711 μ-law keeps one byte per sample (~13-bit quality, plenty
+# for cues): half the flash and half the reads. They stay .wav files, with
+# format tag 7; tools/optimize_audio.py --mulaw writes them.
+#
+# audiocore only plays PCM, so μ-law is decoded here, through a 256-entry
+# table. Short sounds are decoded into RAM when loaded (decode_file).
+# Long ones are played by MuLawStream, a ring.RingStream that decodes the
+# next chunks of the file into its ring as they come due:
+#
+#     stream = MuLawStream(f, sample_rate, data_bytes, playing, stop)
+#     voices.play(stream.sample, "cue", loop=True)
+#     while stream.poll(ticks_ms()):     # False once it is over and stopped
+#         ...                            # every STREAM_POLL_MS or so
+#
+# Only one stream plays at a time: they share the ring buffer.
+
+import array
+
+from buffers import zeros
+from ring import CHUNK_SAMPLES, RING_SAMPLES, RingStream
+
+WAVE_FORMAT_MULAW = 7
+
+
+def _expand(code):
+    # G.711: bits are stored inverted; sign, 3-bit exponent, 4-bit mantissa
+    code = ~code & 0xFF
+    magnitude = ((((code & 0x0F) << 3) + 0x84) << ((code >> 4) & 7)) - 0x84
+    return -magnitude if code & 0x80 else magnitude
+
+
+DECODE = array.array("h", [_expand(code) for code in range(256)])
+
+_ring = None    # array('h'), the two halves every stream plays from
+_raw = None     # bytearray, one chunk as read from the file
+
+
+def decode(src, dst, start, count):
+    """dst[start:start + count] = the 16-bit samples of μ-law bytes src[:count]."""
+    table = DECODE
+    for i in range(count):
+        dst[start + i] = table[src[i]]
+
+
+def decode_file(f, data_bytes):
+    """The next data_bytes of μ-law audio, decoded into an array('h')."""
+    raw = f.read(data_bytes)
+    samples = zeros(len(raw))
+    decode(raw, samples, 0, len(raw))
+    return samples
+
+
+class MuLawStream(RingStream):
+    def __init__(self, f, sample_rate, data_bytes, playing, stop):
+        """
+        f: the WAV file, positioned at its audio data. playing(sample) and
+        stop(sample) as for SoundRegistry. Decodes the first half now, so
+        play self.sample (with loop=True) right after creating it.
+        """
+        global _ring, _raw
+        if _ring is None:
+            _ring = zeros(RING_SAMPLES)
+            _raw = bytearray(CHUNK_SAMPLES)
+        self.file = f
+        self.remaining = data_bytes
+        super().__init__(_ring, sample_rate, playing, stop)
+
+    def fill(self, j, offset):
+        """Decode the next chunk of the file into ring[offset:]."""
+        if self.remaining <= 0:
+            return 0
+        n = self.file.readinto(_raw)
+        if n > self.remaining:
+            n = self.remaining
+        self.remaining -= n
+        decode(_raw, _ring, offset, n)
+        return n
+
+    def close(self):
+        """Stop the sound and close its file."""
+        if not self.active:
+            return
+        super().close()
+        self.file.close()
+        self.file = None
@@ -0,0 +1,109 @@
+# ------------------------------------------------------------
+# PATTERN STREAMS
+# ------------------------------------------------------------
+#
+# Clap by clap, each clap starts when the player task gets to it, so the
+# gaps between claps carry the scheduler's lateness (and the mixer's
+# buffer phase). PatternRenderer instead plays a whole pattern as one
+# sound, a ring.RingStream whose chunks get copies of the clap at exact
+# sample offsets: only its start is scheduled, and the gaps are exact to
+# 1/sample_rate. The claps are copied in as the stream plays, so a
+# pattern of any length needs only the ring (RING_SAMPLES, 16 KB),
+# allocated once; nothing is kept between rounds.
+#
+#     renderer = PatternRenderer(clap_pcm, 16000, playing, stop)
+#     sample = renderer.start(level.pattern_ms)    # at the first beat
+#     voices.play(sample, "pattern", loop=True)
+#     renderer.poll(ticks_ms())                    # every STREAM_POLL_MS or so
+#
+# start(pattern, loops, loop_ms) repeats the pattern every loop_ms in the
+# same stream, so the gaps between repeats are exact too.
+
+from buffers import clear, zeros
+from ring import CHUNK_SAMPLES, RING_SAMPLES, RingStream
+
+
+class PatternStream(RingStream):
+    def __init__(self, ring, clap, offsets, sample_rate, playing, stop):
+        """offsets: where each clap starts (samples from the start), ascending."""
+        self.clap = clap
+        self.offsets = offsets
+        self.first = 0      # index of the first clap that has not ended yet
+        super().__init__(ring, sample_rate, playing, stop)
+
+    def fill(self, j, offset):
+        """Copy the parts of the claps that fall in chunk j to ring[offset:]."""
+        ring, clap, offsets = self.ring, self.clap, self.offsets
+        n = len(clap)
+        begin = j * CHUNK_SAMPLES
+        end = begin + CHUNK_SAMPLES
+        while self.first < len(offsets) and offsets[self.first] + n <= begin:
+            self.first += 1
+        if self.first == len(offsets):
+            return 0
+        size = min(CHUNK_SAMPLES, offsets[-1] + n - begin)
+        clear(ring, offset, offset + size)
+        covered = begin     # the chunk holds a clap up to here
+        for k in range(self.first, len(offsets)):
+            start = offsets[k]
+            if start >= end:
+                break
+            a = max(start, begin)
+            b = min(start + n, end)
+            dst = offset + a - begin
+            if a >= covered:
+                ring[dst:dst + b - a] = clap[a - start:b - start]
+            else:
+                # claps closer than the clap's length: mix, with clipping
+                for i in range(b - a):
+                    v = ring[dst + i] + clap[a - start + i]
+                    ring[dst + i] = 32767 if v > 32767 else -32768 if v < -32768 else v
+            covered = max(covered, b)
+        return size
+
+
+class PatternRenderer:
+    def __init__(self, clap, sample_rate, playing, stop):
+        """
+        clap: the clap's audio, array('h'), mono at sample_rate.
+        playing(sample) and stop(sample) as for SoundRegistry.
+        """
+        self.clap = clap
+        self.sample_rate = sample_rate
+        self.playing = playing
+        self.stop_sample = stop
+        self.ring = zeros(RING_SAMPLES)
+        self.stream = None
+        self.patterns = 0
+        self.underruns = 0
+
+    def start(self, pattern_ms, loops=1, loop_ms=0):
+        """
+        The sample of a stream playing the pattern (beat times in ms)
+        'loops' times, loop_ms apart, from its first beat. Play it with
+        loop=True right away, then poll() until it is over.
+        """
+        self.stop()
+        rate = self.sample_rate
+        first = pattern_ms[0]
+        offsets = [int((loop * loop_ms + beat - first) * rate / 1000 + 0.5)
+                   for loop in range(loops) for beat in pattern_ms]
+        self.stream = PatternStream(self.ring, self.clap, offsets, rate,
+                                    self.playing, self.stop_sample)
+        self.patterns += 1
+        return self.stream.sample
+
+    def poll(self, now):
+        """Keep the stream (if any) writing claps; stop it when it is over."""
+        if self.stream is not None and not self.stream.poll(now):
+            self.stop()
+
+    def stop(self):
+        """Stop the pattern playing, if any."""
+        if self.stream is not None:
+            self.stream.close()
+            self.underruns += self.stream.underruns
+            self.stream = None
+
+    def summary(self):
+        return f"patterns played={self.patterns} underruns={self.underruns}"
@@ -0,0 +1,87 @@
+# ------------------------------------------------------------
+# LOOP PROFILER
+# ------------------------------------------------------------
+#
+# Histogram of loop periods: the ms between consecutive iterations of a
+# timing loop (IMU sampling while the pattern plays, while the player
+# repeats it, and during calibration).
+#
+# All counters are allocated up front and tick() only does small-int
+# arithmetic on them, so it can run in every iteration without touching
+# the heap. Formatting happens only in summary(), between rounds.
+#
+# Periods are in 1 ms buckets; the last bucket also holds everything
+# longer. An overrun is a period longer than overrun_ms (by default twice
+# the loop's target period).
+
+from timebase import ticks_diff
+
+HISTOGRAM_BUCKETS = 32
+
+
+class LoopProfiler:
+    def __init__(self, name, target_ms, overrun_ms=None, buckets=HISTOGRAM_BUCKETS):
+        self.name = name
+        self.target_ms = target_ms
+        self.overrun_ms = overrun_ms if overrun_ms is not None else 2 * target_ms
+        self.counts = [0] * buckets
+        self.reset()
+
+    def reset(self):
+        counts = self.counts
+        for i in range(len(counts)):
+            counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.worst = 0
+        self.overruns = 0
+        self.last = None
+
+    def restart(self):
+        """Forget the previous iteration (the loop paused on purpose)."""
+        self.last = None
+
+    def tick(self, now):
+        """Call once per iteration with the iteration's ticks."""
+        last = self.last
+        self.last = now
+        if last is None:
+            return
+        period = ticks_diff(now, last)
+        top = len(self.counts) - 1
+        self.counts[period if period < top else top] += 1
+        self.count += 1
+        self.total += period
+        if period > self.worst:
+            self.worst = period
+        if period > self.overrun_ms:
+            self.overruns += 1
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, fraction):
+        """Smallest period (ms) that `fraction` of the iterations did not exceed."""
+        if not self.count:
+            return 0
+        needed = fraction * self.count
+        seen = 0
+        for period, n in enumerate(self.counts):
+            seen += n
+            if seen >= needed:
+                return period
+        return len(self.counts) - 1
+
+    def summary(self):
+        if not self.count:
+            return f"{self.name:<6s} no samples"
+        top = len(self.counts) - 1
+        bars = " ".join(
+            f"{period}{'+' if period == top else ''}:{n}"
+            for period, n in enumerate(self.counts) if n
+        )
+        return (f"{self.name:<6s} n={self.count:<5d} mean={self.mean():.1f} ms "
+                f"p50={self.percentile(0.5)} p90={self.percentile(0.9)} "
+                f"p99={self.percentile(0.99)} worst={self.worst} ms "
+                f"overruns(>{self.overrun_ms} ms)={self.overruns}\n"
+                f"         periods ms:count {bars}")
@@ -0,0 +1,104 @@
+# ------------------------------------------------------------
+# RING STREAMS
+# ------------------------------------------------------------
+#
+# A sound too long to keep in RAM plays through a looping,
+# double-buffered RawSample (single_buffer=False) over a small ring
+# buffer: while the audio side plays one half of the ring, poll() writes
+# the next chunks of the sound into the other half. A subclass says what
+# chunk j holds (fill): mulaw.py decodes it from a file, patterns.py
+# copies claps into it.
+#
+#     ring = zeros(RING_SAMPLES)       # one per kind of stream
+#     stream = SomeStream(ring, sample_rate, playing, stop, ...)
+#     voices.play(stream.sample, channel, loop=True)
+#     while stream.poll(ticks_ms()):     # False once it is over and stopped
+#         ...                            # every STREAM_POLL_MS or so
+#
+# Nothing tells Python which half is playing, so chunks are written on a
+# timetable from the start of the stream: chunk j is written LEAD_MS
+# after the half it replaces has started its last play. LEAD_MS covers
+# the mixer's output latency. A poll that comes too late to write a chunk
+# before it is played lets the ring replay stale audio (counted in
+# underruns). Streams on the same ring cannot play at the same time.
+
+from audiocore import RawSample
+
+from buffers import clear
+from timebase import ticks_add, ticks_diff, ticks_ms
+
+CHUNK_SAMPLES = 2048    # written per poll (128 ms at 16 kHz)
+HALF_CHUNKS = 2         # chunks per half of the ring
+RING_SAMPLES = 2 * HALF_CHUNKS * CHUNK_SAMPLES     # 16 KB
+LEAD_MS = 50            # after a half starts playing, before its next chunk is written
+
+
+class RingStream:
+    def __init__(self, ring, sample_rate, playing, stop):
+        """
+        ring: array('h') of RING_SAMPLES. playing(sample) and stop(sample)
+        as for SoundRegistry. Writes the first half now, so play
+        self.sample (with loop=True) right after creating it.
+        """
+        self.ring = ring
+        self.sample_rate = sample_rate
+        self.playing = playing
+        self.stop = stop
+        self.underruns = 0
+        self.length = None      # samples in the sound, once its end is reached
+        self.active = True
+        self.sample = RawSample(ring, channel_count=1, sample_rate=sample_rate,
+                                single_buffer=False)
+        for j in range(HALF_CHUNKS):
+            self._put(j)
+        self.next_chunk = HALF_CHUNKS
+        self.start = ticks_ms()     # ~ when play() is called
+
+    def fill(self, j, offset):
+        """
+        Write chunk j of the sound to ring[offset:offset + CHUNK_SAMPLES];
+        return how many samples it has (fewer than CHUNK_SAMPLES: the end).
+        """
+        raise NotImplementedError
+
+    def _ms(self, samples):
+        return samples * 1000 // self.sample_rate
+
+    def _put(self, j):
+        """Write chunk j into its place in the ring (zeros past the end)."""
+        offset = j % (2 * HALF_CHUNKS) * CHUNK_SAMPLES
+        n = 0
+        if self.length is None:
+            n = self.fill(j, offset)
+            if n < CHUNK_SAMPLES:
+                self.length = j * CHUNK_SAMPLES + n
+        clear(self.ring, offset + n, offset + CHUNK_SAMPLES)
+
+    def poll(self, now):
+        """Write the chunks that are due; False once the sound is over (and stopped)."""
+        if not self.active:
+            return False
+        over = self.length is not None and ticks_diff(
+            now, ticks_add(self.start, self._ms(self.length) + LEAD_MS)) >= 0
+        if over or not self.playing(self.sample):
+            self.close()
+            return False
+        while True:
+            j = self.next_chunk
+            due = ticks_add(self.start, self._ms((j - HALF_CHUNKS) * CHUNK_SAMPLES) + LEAD_MS)
+            if ticks_diff(now, due) < 0:
+                return True
+            # Its half starts playing (again) this long after the stream started
+            plays = self._ms(j // HALF_CHUNKS * HALF_CHUNKS * CHUNK_SAMPLES)
+            if ticks_diff(now, ticks_add(self.start, plays)) > 0:
+                self.underruns += 1
+            self._put(j)
+            self.next_chunk = j + 1
+
+    def close(self):
+        """Stop the sound."""
+        if not self.active:
+            return
+        self.active = False
+        self.stop(self.sample)
+        self.sample.deinit()
@@ -0,0 +1,82 @@
+# ------------------------------------------------------------
+# RING-BUFFER LOG
+# ------------------------------------------------------------
+#
+# print() blocks until USB serial has taken the text, so a print inside a
+# timed phase can delay a clap or a hit timestamp. Game code logs into a
+# RAM ring buffer instead, and the master loop flushes it between rounds.
+#
+# A record is a format string (a constant, so storing it is just a
+# reference) plus up to three arguments, kept in preallocated slots.
+# Nothing is formatted until flush(), so logging ints and floats from a
+# timing loop allocates nothing. When the buffer is full the oldest
+# records are overwritten and counted as dropped.
+#
+#     log.info("Beat {} at t={:.2f}", n, seconds)
+#     log.flush()   # between rounds
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+
+class RingLog:
+    def __init__(self, size=64, level=INFO):
+        self.size = size
+        self.level = level      # records below this level are not kept
+        self._levels = [0] * size
+        self._formats = [None] * size
+        self._a = [None] * size
+        self._b = [None] * size
+        self._c = [None] * size
+        self._next = 0
+        self._count = 0
+        self.dropped = 0
+
+    def log(self, level, fmt, a=None, b=None, c=None):
+        if level < self.level:
+            return
+        i = self._next
+        self._levels[i] = level
+        self._formats[i] = fmt
+        self._a[i] = a
+        self._b[i] = b
+        self._c[i] = c
+        i += 1
+        self._next = 0 if i == self.size else i
+        if self._count < self.size:
+            self._count += 1
+        else:
+            self.dropped += 1
+
+    def debug(self, fmt, a=None, b=None, c=None):
+        self.log(DEBUG, fmt, a, b, c)
+
+    def info(self, fmt, a=None, b=None, c=None):
+        self.log(INFO, fmt, a, b, c)
+
+    def warning(self, fmt, a=None, b=None, c=None):
+        self.log(WARNING, fmt, a, b, c)
+
+    def error(self, fmt, a=None, b=None, c=None):
+        self.log(ERROR, fmt, a, b, c)
+
+    def flush(self, write=print):
+        """Format and write every buffered record, oldest first, then empty the buffer."""
+        if self.dropped:
+            write(f"(log: {self.dropped} older records dropped)")
+        i = (self._next - self._count) % self.size
+        for _ in range(self._count):
+            text = self._formats[i].format(self._a[i], self._b[i], self._c[i])
+            level = self._levels[i]
+            if level >= ERROR:
+                text = "ERROR: " + text
+            elif level >= WARNING:
+                text = "WARNING: " + text
+            write(text)
+            # drop the references so flushed arguments can be collected
+            self._formats[i] = self._a[i] = self._b[i] = self._c[i] = None
+            i = (i + 1) % self.size
+        self._count = 0
+        self.dropped = 0
@@ -0,0 +1,218 @@
+# ------------------------------------------------------------
+# DEADLINE SCHEDULER
+# ------------------------------------------------------------
+#
+# Events (beats, sensor polls, display frames) sit in a queue ordered by
+# absolute deadline. run() sleeps exactly until the earliest one, fires it
+# and records how late it actually ran, per event kind.
+#
+# Deadlines are timebase ticks (integer ms, wrapping), so ordering and
+# lateness always go through ticks_diff().
+#
+# Periodic events are re-armed at deadline + period (not now + period), so
+# they never drift. Each kind's callback cost is measured too: if running a
+# low-priority event (a sensor poll) would overlap a higher-priority one
+# (a beat), the beat goes first and the poll runs right after it. Under
+# asyncio each task owns a Scheduler (so stats are per task); yield_to()
+# extends the same rule to another task's high-priority events.
+#
+# The queue is a small sorted list: CircuitPython has no heapq and a level
+# only ever has a handful of pending events.
+
+import asyncio
+import time
+
+from timebase import ticks_add, ticks_diff, ticks_ms
+
+ASYNC_SLICE_MS = 10  # longest uninterrupted asyncio sleep in run_async()
+
+
+class LatenessStats:
+    """Running lateness statistics for one event kind (ms)."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.worst = 0
+        self.skipped = 0   # periodic deadlines dropped because we fell behind
+        self.cost = 0      # total ms spent in the callbacks
+
+    def add(self, lateness):
+        self.count += 1
+        self.total += lateness
+        if lateness > self.worst:
+            self.worst = lateness
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def mean_cost(self):
+        return self.cost / self.count if self.count else 0.0
+
+    def __str__(self):
+        return (f"{self.kind:<6s} n={self.count:<4d} late mean={self.mean():.2f} ms "
+                f"worst={self.worst} ms skipped={self.skipped} "
+                f"cost={self.mean_cost():.2f} ms")
+
+
+async def sleep_until(deadline, stats=None):
+    """asyncio sleep until `deadline` (ticks); record lateness. Returns now."""
+    wait = ticks_diff(deadline, ticks_ms())
+    if wait > 0:
+        await asyncio.sleep(wait / 1000)
+    now = ticks_ms()
+    if stats is not None:
+        stats.add(ticks_diff(now, deadline))
+    return now
+
+
+class Scheduler:
+    def __init__(self):
+        self._queue = []   # [deadline, priority, seq, kind, callback, period], sorted
+        self._seq = 0
+        self._running = False
+        self._yield_to = []
+        self.stats = {}
+
+    def at(self, deadline, kind, callback, period=None, priority=1):
+        """Run callback(now) at absolute time `deadline` (ticks)."""
+        self._seq += 1
+        self._insert([deadline, priority, self._seq, kind, callback, period])
+
+    def every(self, period, kind, callback, start, priority=1):
+        """Run callback(now) at start, start + period, start + 2*period... (ms)"""
+        self.at(start, kind, callback, period, priority)
+
+    def yield_to(self, other):
+        """Hold back low-priority events while `other` has a priority-0 event due."""
+        self._yield_to.append(other)
+
+    def next_urgent(self):
+        """Deadline of the earliest priority-0 event, or None."""
+        for event in self._queue:
+            if event[1] == 0:
+                return event[0]
+        return None
+
+    def stop(self):
+        """Make run() return once the current callback finishes."""
+        self._running = False
+
+    def cancel(self, callback):
+        """Drop every pending event that would call `callback`."""
+        self._queue = [event for event in self._queue if event[4] is not callback]
+
+    def run(self):
+        """Fire events in deadline order until stop() or the queue is empty."""
+        self._running = True
+        while self._running and self._queue:
+            event = self._next()
+            now = ticks_ms()
+            wait = ticks_diff(event[0], now)
+            if wait > 0:
+                time.sleep(wait / 1000)
+                now = ticks_ms()
+            self._fire(event, now)
+
+    async def run_async(self, forever=False):
+        """
+        Same as run(), but waits with asyncio so other tasks keep running.
+        Other tasks may add events while this one sleeps; long waits are cut
+        into ASYNC_SLICE_MS pieces so an earlier newcomer is not missed.
+        With forever=True an empty queue idles instead of returning.
+        """
+        self._running = True
+        while self._running:
+            if not self._queue:
+                if not forever:
+                    break
+                await asyncio.sleep(ASYNC_SLICE_MS / 1000)
+                continue
+            event = self._next()
+            now = ticks_ms()
+            wait = ticks_diff(event[0], now)
+            if wait > 0:
+                await asyncio.sleep(min(wait, ASYNC_SLICE_MS) / 1000)
+                continue
+            if event[1] > 0 and self._blocked(event, now):
+                await asyncio.sleep(0)
+                continue
+            self._fire(event, now)
+            await asyncio.sleep(0)  # never starve the other tasks
+
+    def _blocked(self, event, now):
+        stats = self.stats.get(event[3])
+        busy = stats.mean_cost() if stats else 0.0
+        for other in self._yield_to:
+            urgent = other.next_urgent()
+            if urgent is not None and ticks_diff(urgent, now) <= busy:
+                return True
+        return False
+
+    def _fire(self, event, now):
+        self._queue.remove(event)
+        deadline = event[0]
+        kind = event[3]
+        stats = self._stat(kind)
+        stats.add(ticks_diff(now, deadline))
+
+        period = event[5]
+        if period:
+            # Next slot on the original grid; if we overran several
+            # periods, skip them instead of firing a burst
+            deadline = ticks_add(deadline, period)
+            while ticks_diff(deadline, now) <= 0:
+                deadline = ticks_add(deadline, period)
+                stats.skipped += 1
+            event[0] = deadline
+            self._insert(event)
+
+        event[4](now)
+        stats.cost += ticks_diff(ticks_ms(), now)
+
+    def report(self):
+        for kind in self.stats:
+            print(" ", self.stats[kind])
+
+    def reset_stats(self):
+        for stats in self.stats.values():
+            stats.reset()
+
+    def _next(self):
+        """Earliest event, unless it would still be running when a more
+        important one is due."""
+        queue = self._queue
+        event = queue[0]
+        if event[1] == 0 or len(queue) == 1:
+            return event
+        stats = self.stats.get(event[3])
+        busy = stats.mean_cost() if stats else 0.0
+        for other in queue:
+            if ticks_diff(other[0], event[0]) > busy:
+                break
+            if other[1] < event[1]:
+                return other
+        return event
+
+    def _stat(self, kind):
+        stats = self.stats.get(kind)
+        if stats is None:
+            stats = self.stats[kind] = LatenessStats(kind)
+        return stats
+
+    def _insert(self, event):
+        # Ordered by (deadline, priority, seq); deadlines compared wrap-safe
+        queue = self._queue
+        i = len(queue)
+        while i > 0:
+            other = queue[i - 1]
+            diff = ticks_diff(other[0], event[0])
+            if diff < 0 or (diff == 0 and (other[1] < event[1] or
+                                           (other[1] == event[1] and other[2] <= event[2]))):
+                break
+            i -= 1
+        queue.insert(i, event)
@@ -0,0 +1,210 @@
+# ------------------------------------------------------------
+# SOUND LOADING
+# ------------------------------------------------------------
+#
+# A WaveFile streams from flash: every play seeks the file and the first
+# buffers come from flash reads, which is where the hit feedback and the
+# claps spend their start-up time. Short samples are cheap to keep in RAM,
+# so any WAV whose audio data is at most RAM_SAMPLE_MAX_BYTES is read into
+# an array when it is registered and played as a RawSample. Longer ones
+# (boot, success, fail...) keep streaming from their file.
+#
+# SoundRegistry holds the game's sounds by name. Streamed sounds are only
+# opened when played, closed again once they have finished, and at most
+# max_open of them are open at a time (the least recently played one that
+# is not playing is closed first).
+#
+#     sounds = SoundRegistry(playing=voices.is_playing, stop=voices.stop_sample)
+#     sounds.add("beat", "beat.wav")
+#     sample = sounds.get("beat")   # None if the file could not be loaded
+#
+# PCM and μ-law WAVs are supported. 16-bit PCM samples are the ones that
+# go to RAM (8-bit WAVs always stream). μ-law sounds are decoded into RAM
+# if they fit, else played by a mulaw.MuLawStream: get() starts it, its
+# sample must be played with loop=True (see loops()), and poll(now) must
+# be called every few tens of ms while it plays (see mulaw.py).
+
+import struct
+
+from audiocore import RawSample, WaveFile
+
+import mulaw
+from buffers import zeros
+
+RAM_SAMPLE_MAX_BYTES = 8192   # beat.wav and clap-drum.wav fit; go.wav (21 KB) streams
+MAX_OPEN_SOUNDS = 2           # streamed sounds with an open file at the same time
+
+
+WAVE_FORMAT_PCM = 1
+
+
+def read_wav_format(f):
+    """
+    Parse the RIFF header of an open WAV file and leave it at the start of
+    the audio data. Returns (format tag, sample_rate, channels, bits,
+    data_bytes).
+    """
+    riff = f.read(12)
+    if len(riff) < 12 or riff[0:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("not a WAV file")
+    fmt = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("no data chunk")
+        size = struct.unpack("<I", chunk[4:8])[0]
+        kind = chunk[0:4]
+        if kind == b"fmt ":
+            fmt = struct.unpack("<HHIIHH", f.read(16))
+            f.seek(size - 16 + (size & 1), 1)
+        elif kind == b"data":
+            if fmt is None:
+                raise ValueError("data before fmt chunk")
+            return fmt[0], fmt[2], fmt[1], fmt[5], size
+        else:
+            f.seek(size + (size & 1), 1)   # chunks are padded to even sizes
+
+
+def read_pcm(f, data_bytes):
+    """The next data_bytes of 16-bit little-endian audio, as an array('h')."""
+    samples = zeros(data_bytes // 2)
+    f.readinto(samples)
+    return samples
+
+
+class SoundRegistry:
+    def __init__(self, playing, stop, max_open=MAX_OPEN_SOUNDS,
+                 ram_max_bytes=RAM_SAMPLE_MAX_BYTES):
+        """
+        playing(sample): True while 'sample' is being played. stop(sample):
+        called before its file is closed.
+        """
+        self.playing = playing
+        self.stop = stop
+        self.max_open = max_open
+        self.ram_max_bytes = ram_max_bytes
+        self.resident = {}      # name -> RawSample
+        self.pcm = {}           # name -> its audio, array('h'), for RAM sounds
+        self.streamed = {}      # name -> filename
+        self.handles = {}       # name -> (file, WaveFile) of open streamed sounds
+        self.recent = []        # names in self.handles, least recently played first
+        self.mulaw = {}         # name -> filename, μ-law sounds too long for RAM
+        self.stream = None      # the MuLawStream playing, if any
+        self.opens = 0
+        self.evictions = 0
+        self.underruns = 0      # of finished μ-law streams
+
+    def add(self, name, filename):
+        """Register a sound; RAM-sized ones are loaded now. False if it cannot be read."""
+        try:
+            with open(filename, "rb") as f:
+                fmt, sample_rate, channels, bits, data_bytes = read_wav_format(f)
+                if fmt == mulaw.WAVE_FORMAT_MULAW:
+                    if channels != 1:
+                        raise ValueError("mu-law must be mono")
+                    if 2 * data_bytes > self.ram_max_bytes:
+                        self.mulaw[name] = filename
+                        return True
+                    samples = self.pcm[name] = mulaw.decode_file(f, data_bytes)
+                    self.resident[name] = RawSample(samples, channel_count=1,
+                                                    sample_rate=sample_rate)
+                    return True
+                if fmt != WAVE_FORMAT_PCM:
+                    raise ValueError("not PCM or mu-law")
+                if bits == 16 and data_bytes <= self.ram_max_bytes:
+                    samples = self.pcm[name] = read_pcm(f, data_bytes)
+                    self.resident[name] = RawSample(samples, channel_count=channels,
+                                                    sample_rate=sample_rate)
+                    return True
+            self.streamed[name] = filename
+            return True
+        except Exception as e:
+            print("ERROR loading", filename, ":", e)
+            return False
+
+    def add_pcm(self, name, samples, sample_rate, channels=1):
+        """Register audio already in RAM (array('h'), e.g. from synth.py)."""
+        self.pcm[name] = samples
+        self.resident[name] = RawSample(samples, channel_count=channels, sample_rate=sample_rate)
+
+    def get(self, name):
+        """The sample to play for 'name', opening its file if it streams."""
+        sample = self.resident.get(name)
+        if sample is not None:
+            return sample
+        if name in self.mulaw:
+            return self._start_stream(self.mulaw[name])
+        handle = self.handles.get(name)
+        if handle is not None:
+            self.recent.remove(name)
+            self.recent.append(name)
+            return handle[1]
+        filename = self.streamed.get(name)
+        if filename is None:
+            return None
+        self.close_finished()
+        if len(self.handles) >= self.max_open:
+            self._evict()
+        f = open(filename, "rb")
+        handle = self.handles[name] = (f, WaveFile(f))
+        self.recent.append(name)
+        self.opens += 1
+        return handle[1]
+
+    def _start_stream(self, filename):
+        # One μ-law stream at a time: they share the decode buffer
+        self._end_stream()
+        f = open(filename, "rb")
+        try:
+            _, sample_rate, _, _, data_bytes = read_wav_format(f)
+            self.stream = mulaw.MuLawStream(f, sample_rate, data_bytes,
+                                            self.playing, self.stop)
+        except Exception:
+            f.close()
+            raise
+        self.opens += 1
+        return self.stream.sample
+
+    def _end_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.underruns += self.stream.underruns
+            self.stream = None
+
+    def loops(self, sample):
+        """True for a μ-law stream's sample, which must be played with loop=True."""
+        return self.stream is not None and sample is self.stream.sample
+
+    def poll(self, now):
+        """Keep the μ-law stream (if any) decoding; stop it when it is over."""
+        if self.stream is not None and not self.stream.poll(now):
+            self._end_stream()
+
+    def close_finished(self):
+        """Close the files of streamed sounds that are not playing any more."""
+        for name in self.recent[:]:
+            if not self.playing(self.handles[name][1]):
+                self._close(name)
+
+    def _evict(self):
+        # Least recently played first; a sound still playing is only
+        # closed if every open one is playing
+        victim = self.recent[0]
+        for name in self.recent:
+            if not self.playing(self.handles[name][1]):
+                victim = name
+                break
+        self._close(victim)
+        self.evictions += 1
+
+    def _close(self, name):
+        f, wav = self.handles.pop(name)
+        self.recent.remove(name)
+        self.stop(wav)
+        wav.deinit()
+        f.close()
+
+    def summary(self):
+        return (f"sounds ram={len(self.resident)} streamed={len(self.streamed)} "
+                f"mulaw={len(self.mulaw)} open={len(self.handles)}/{self.max_open} "
+                f"opens={self.opens} evictions={self.evictions} underruns={self.underruns}")
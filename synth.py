@@ -0,0 +1,68 @@
+# ------------------------------------------------------------
+# SYNTHESIZED FEEDBACK SOUNDS
+# ------------------------------------------------------------
+#
+# The clap and the hit feedback are short percussive sounds, simple to
+# generate: code.py renders them at boot into array('h') buffers (played
+# as RawSample from RAM) instead of loading WAVs. No files, no flash reads,
+# and a sound is retuned by changing its parameters.
+#
+# A sound is a parameter tuple (hashable, so renders are cached per
+# parameter set and sample rate):
+#
+#     (kind, frequency Hz, duration ms, decay ms, level 0-1)
+#
+#   "tone"   sine at 'frequency' with an exponential decay
+#   "noise"  white noise through a one-pole low-pass at 'frequency',
+#            with an exponential decay
+#
+# 'decay' is the time constant: the level falls to 37% after decay ms.
+#
+# Noise comes from a 16-bit xorshift of its own, so rendering neither
+# reseeds nor draws from the global random module (the level selector
+# uses that), and its state stays a small int.
+
+import math
+
+from buffers import zeros
+
+SEED = 1    # noise is the same on every boot (any value but 0)
+
+_cache = {}
+
+
+def render(params, sample_rate):
+    """The sound as array('h') (mono, 16-bit), cached per (params, sample_rate)."""
+    key = (params, sample_rate)
+    samples = _cache.get(key)
+    if samples is None:
+        samples = _cache[key] = _render(params, sample_rate)
+    return samples
+
+
+def _render(params, sample_rate):
+    kind, frequency, duration_ms, decay_ms, level = params
+    count = duration_ms * sample_rate // 1000
+    samples = zeros(count)
+    amp = level * 32767
+    fall = math.exp(-1000 / (decay_ms * sample_rate))   # per-sample decay factor
+
+    if kind == "tone":
+        step = 2 * math.pi * frequency / sample_rate
+        for i in range(count):
+            samples[i] = int(amp * math.sin(step * i))
+            amp *= fall
+    elif kind == "noise":
+        state = SEED
+        alpha = 1 - math.exp(-2 * math.pi * frequency / sample_rate)
+        y = 0.0
+        for i in range(count):
+            state ^= (state << 7) & 0xFFFF
+            state ^= state >> 9
+            state ^= (state << 8) & 0xFFFF
+            y += alpha * ((state - 32768) / 32768 - y)
+            samples[i] = int(amp * y)
+            amp *= fall
+    else:
+        raise ValueError("unknown sound kind: " + kind)
+    return samples
@@ -0,0 +1,44 @@
+# ------------------------------------------------------------
+# TIMEBASE
+# ------------------------------------------------------------
+#
+# Integer millisecond ticks for all game timing.
+#
+# time.monotonic() is a float; on CircuitPython its resolution drops as
+# uptime grows (tens of ms after a day), which is a problem for kiosks
+# that run all day. supervisor.ticks_ms() is an integer that never loses
+# resolution and stays a small int (no heap allocation per read). It wraps
+# every 2**29 ms (~6.2 days), so always compare ticks with ticks_diff()
+# and offset them with ticks_add(), never with - or <.
+#
+# Same arithmetic as adafruit_ticks; valid while the two ticks compared
+# are less than ~3.1 days apart.
+
+try:
+    from supervisor import ticks_ms
+except ImportError:
+    # Host Python: build the same wrapping counter from monotonic_ns
+    import time
+
+    def ticks_ms():
+        return (time.monotonic_ns() // 1_000_000) & _TICKS_MAX
+
+_TICKS_PERIOD = 1 << 29
+_TICKS_MAX = _TICKS_PERIOD - 1
+_TICKS_HALFPERIOD = _TICKS_PERIOD // 2
+
+
+def ticks_add(ticks, delta):
+    """ticks + delta (ms), wrapped."""
+    return (ticks + delta) % _TICKS_PERIOD
+
+
+def ticks_diff(ticks1, ticks2):
+    """Signed ms from ticks2 to ticks1 (ticks1 - ticks2), wrap-safe."""
+    diff = (ticks1 - ticks2) & _TICKS_MAX
+    diff = ((diff + _TICKS_HALFPERIOD) & _TICKS_MAX) - _TICKS_HALFPERIOD
+    return diff
+
+
+def seconds_to_ms(seconds):
+    return int(seconds * 1000 + 0.5)
@@ -0,0 +1,463 @@
+"""
+Heap allocation check for the sample-to-decision hot path (runs on a
+computer, not the board).
+
+On the board the test is simple: gc.mem_free() must not change while the
+input phase samples the IMU. Host Python has no gc.mem_free(), and its
+floats, tuples and ints come from freelists, so the real allocator does not
+show per-sample garbage either. This tool provides a gc.mem_free() that
+follows CircuitPython's rules instead: every bytecode that builds an
+object (tuples, lists, dicts, strings, f-strings, closures, slices) and
+every builtin that returns a new object is charged to a simulated heap.
+Floats and ints below 2**30 are immediate values on CircuitPython and
+cost nothing.
+
+It then checks code.py's own sample(), the hot path of every IMU poll
+(profiler, GC guard, burst read, detector, shake event, hit feedback,
+hit buffer and practice mode's hit handler). code.py is loaded and run
+the way hostsim runs it until its first hit of an input phase, then its
+IMU scheduler fires the polls while the modelled player keeps striking.
+Only the game's files are charged, not hostsim's fake hardware. This is
+done for a listen-then-repeat round and for a practice round.
+
+For comparison, the IMU read and detection alone are also run through
+BurstReader + ShakeDetector.update_motion and through the old
+icm.acceleration / icm.gyro + ShakeDetector.update path. Both see the
+same simulated strikes, and their decisions must match.
+
+    python tools/alloc_check.py
+    python tools/alloc_check.py --samples 5000 --verbose
+
+It also checks that logging a record into ringlog.RingLog and starting a
+sound through voices.VoiceManager (picked from feedback.FeedbackBank)
+allocate nothing, since the clap callback logs and a hit plays its
+feedback from inside the timed phase.
+
+Exits with status 1 if the hot path allocates or the decisions differ.
+"""
+
+import argparse
+import array
+import dis
+import gc
+import math
+import os
+import struct
+import sys
+import types
+
+THIS_FILE = os.path.abspath(__file__)
+ROOT = os.path.dirname(os.path.dirname(THIS_FILE))
+sys.path.insert(0, ROOT)
+
+HEAP_BYTES = 128 * 1024
+BLOCK = 16  # CircuitPython GC block size (bytes)
+
+
+def blocks(nbytes):
+    return -(-nbytes // BLOCK) * BLOCK
+
+
+class HeapModel:
+    """Charges what CircuitPython would allocate while tracing is on."""
+
+    OPS = {
+        # opcode: bytes for an object with `arg` items (32-bit words)
+        "BUILD_TUPLE": lambda n: blocks(8 + 4 * n),
+        "BUILD_LIST": lambda n: blocks(16) + blocks(4 * max(n, 4)),
+        "BUILD_SET": lambda n: blocks(16) + blocks(8 * max(n, 4)),
+        "BUILD_MAP": lambda n: blocks(16) + blocks(8 * max(n, 4)),
+        "BUILD_CONST_KEY_MAP": lambda n: blocks(16) + blocks(8 * max(n, 4)),
+        "BUILD_STRING": lambda n: blocks(16 + 8 * n),
+        "FORMAT_VALUE": lambda n: blocks(24),
+        "BUILD_SLICE": lambda n: blocks(16),
+        "MAKE_FUNCTION": lambda n: blocks(24),
+        "CALL_FUNCTION_EX": lambda n: blocks(24),
+        "LIST_TO_TUPLE": lambda n: blocks(24),
+        "RETURN_GENERATOR": lambda n: blocks(64),
+    }
+    # Builtins that always return a new heap object on CircuitPython
+    BUILTINS = {
+        print: 32, format: 24, repr: 24, str: 24, sorted: 32, list: 32, tuple: 24,
+        dict: 48, set: 48, bytes: 24, bytearray: 24, struct.unpack: 24,
+        struct.unpack_from: 24, struct.pack: 24, "".join: 32, "".format: 32,
+    }
+
+    def __init__(self, size=HEAP_BYTES):
+        self.size = size
+        self.used = 0
+        self.native = set()   # code objects that stand in for C code
+        self.sites = {}       # (file, line, what) -> bytes
+
+    def traced(self, code):
+        """Game code (and this tool's models of driver code); not hostsim's fakes or the stdlib."""
+        if code in self.native:
+            return False
+        path = os.path.abspath(code.co_filename)
+        return os.path.dirname(path) == ROOT or path == THIS_FILE
+
+    def mem_free(self):
+        return self.size - self.used
+
+    def charge(self, frame, what, nbytes):
+        self.used += nbytes
+        key = (os.path.relpath(frame.f_code.co_filename, ROOT), frame.f_lineno, what)
+        self.sites[key] = self.sites.get(key, 0) + nbytes
+
+    # -- sys.settrace: one event per bytecode of traced Python frames --
+    def _trace(self, frame, event, arg):
+        if event != "call" or not self.traced(frame.f_code):
+            return None
+        frame.f_trace_opcodes = True
+        return self._opcode
+
+    def _opcode(self, frame, event, arg):
+        if event == "opcode":
+            code = frame.f_code.co_code
+            op = dis.opname[code[frame.f_lasti]]
+            cost = self.OPS.get(op)
+            if cost is not None:
+                self.charge(frame, op, cost(code[frame.f_lasti + 1]))
+        return self._opcode
+
+    # -- sys.setprofile: calls into C builtins --
+    def _profile(self, frame, event, arg):
+        if event != "c_call" or not self.traced(frame.f_code):
+            return
+        nbytes = self.BUILTINS.get(arg)
+        if nbytes is None:
+            owner = getattr(arg, "__self__", None)
+            name = getattr(arg, "__name__", "")
+            if isinstance(owner, list) and name in ("append", "insert", "extend"):
+                # CircuitPython lists double their storage when full
+                n = len(owner)
+                if n >= 4 and n & (n - 1) == 0:
+                    nbytes = blocks(8 * n)
+            elif isinstance(owner, (dict, set)) and name in ("add", "setdefault", "update"):
+                nbytes = 0 if owner else blocks(64)
+            elif isinstance(owner, str):
+                nbytes = 32
+        if nbytes:
+            self.charge(frame, getattr(arg, "__qualname__", str(arg)), nbytes)
+
+    def __enter__(self):
+        sys.settrace(self._trace)
+        sys.setprofile(self._profile)
+        return self
+
+    def __exit__(self, *exc):
+        sys.settrace(None)
+        sys.setprofile(None)
+
+
+heap = HeapModel()
+gc.mem_free = heap.mem_free   # before importing gcguard, which looks it up once
+heap.native.add(HeapModel.mem_free.__code__)
+
+
+class VirtualClock:
+    def __init__(self):
+        self.ms = 0
+
+    def ticks_ms(self):
+        return self.ms & ((1 << 29) - 1)
+
+
+clock = VirtualClock()
+supervisor = types.ModuleType("supervisor")
+supervisor.ticks_ms = clock.ticks_ms
+sys.modules["supervisor"] = supervisor
+heap.native.add(VirtualClock.ticks_ms.__code__)
+
+# feedback.py builds its RawSamples at load; only pick() is traced
+audiocore = types.ModuleType("audiocore")
+audiocore.RawSample = lambda buffer, **kwargs: buffer
+sys.modules["audiocore"] = audiocore
+
+import hostsim  # noqa: E402
+from detector import GRAVITY, ShakeDetector  # noqa: E402
+from feedback import FeedbackBank  # noqa: E402
+from gcguard import GCGuard  # noqa: E402
+from imu import BurstReader  # noqa: E402
+from profiler import LoopProfiler  # noqa: E402
+from ringlog import DEBUG, RingLog  # noqa: E402
+from scheduler import Scheduler  # noqa: E402
+from voices import VoiceManager  # noqa: E402
+
+ACCEL_LSB_PER_G = 8192   # AccelRange.RANGE_4G
+GYRO_LSB_PER_DPS = 32.8  # GyroRange.RANGE_1000_DPS
+POLL_MS = 5
+MAX_HITS = 32
+STRIKE_EVERY_MS = 600   # strikes while code.py's sample() is checked
+
+
+class FakeSensor:
+    """Raw ICM20948 registers: gravity on Z, a strike every 600 ms."""
+
+    def __init__(self):
+        self.regs = bytearray(12)
+
+    def update(self, t):
+        phase = t % 600
+        strike = 3.0 * math.sin(math.pi * phase / 50) if phase < 50 else 0.0
+        swing = 9.0 * math.sin(math.pi * (phase - 480) / 120) if phase >= 480 else 0.0
+        raw = (
+            (31 * t) % 200 - 100, (17 * t) % 160 - 80,
+            round((1 + strike) * ACCEL_LSB_PER_G),
+            round(swing / 0.017453293 * GYRO_LSB_PER_DPS), (13 * t) % 60 - 30, 0,
+        )
+        struct.pack_into(">hhhhhh", self.regs, 0, *[max(-32768, min(32767, v)) for v in raw])
+
+
+class FakeI2CDevice:
+    """Stands in for adafruit_bus_device's I2CDevice (native I2C)."""
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write_then_readinto(self, out_buffer, in_buffer):
+        start = out_buffer[0] - 0x2D
+        in_buffer[:] = self.sensor.regs[start:start + len(in_buffer)]
+
+
+class DriverICM:
+    """The ICM20948 driver's read path: bank write, Struct read, new tuple."""
+
+    def __init__(self, sensor):
+        self.sensor = sensor
+        self._bank_reg = 0
+
+    @property
+    def acceleration(self):
+        self._bank_reg = 0 << 4
+        raw = struct.unpack_from(">hhh", self.sensor.regs, 0)
+        scale = 9.80665 / ACCEL_LSB_PER_G
+        return (raw[0] * scale, raw[1] * scale, raw[2] * scale)
+
+    @property
+    def gyro(self):
+        self._bank_reg = 0 << 4
+        raw = struct.unpack_from(">hhh", self.sensor.regs, 6)
+        scale = 0.017453293 / GYRO_LSB_PER_DPS
+        return (raw[0] * scale, raw[1] * scale, raw[2] * scale)
+
+
+class FakeVoice:
+    """Stands in for audiomixer's MixerVoice (native)."""
+
+    def __init__(self):
+        self.level = 1.0
+        self.playing = False
+
+    def play(self, sample, loop=False):
+        self.playing = True
+
+    def stop(self):
+        self.playing = False
+
+
+def mark_native(code):
+    heap.native.add(code)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            mark_native(const)
+
+
+for cls in (FakeSensor, FakeI2CDevice, FakeVoice):
+    for attr in vars(cls).values():
+        if isinstance(attr, types.FunctionType):
+            mark_native(attr.__code__)
+
+
+def run_path(samples, new_path):
+    """
+    Poll `samples` times through a Scheduler like the IMU task does.
+    Returns (decision times, bytes allocated while sampling).
+    """
+    sensor = FakeSensor()
+    reader = BurstReader(FakeI2CDevice(sensor), ACCEL_LSB_PER_G, GYRO_LSB_PER_DPS)
+    icm = DriverICM(sensor)
+    detector = ShakeDetector(0.8, 3.0)
+    profile = LoopProfiler("input", POLL_MS)
+    guard = GCGuard(POLL_MS)
+    sched = Scheduler()
+    other = Scheduler()
+    sched.yield_to(other)
+    hits = [0] * MAX_HITS
+    hit_count = 0
+
+    def sample(now):   # code.py's sample() during the input phase
+        nonlocal hit_count
+        profile.tick(now)
+        guard.sample(now)
+        if new_path:
+            reader.read()
+            shake = detector.update_motion(reader.accel_extra, reader.gyro_mag, now)
+        else:
+            ax, ay, az = icm.acceleration
+            gx, gy, gz = icm.gyro
+            shake = detector.update(ax, ay, az, gx, gy, gz, now)
+        if shake and hit_count < MAX_HITS:
+            hits[hit_count] = now
+            hit_count += 1
+
+    clock.ms = 1000
+    sched.every(POLL_MS, "imu", sample, clock.ticks_ms())
+    guard.begin_window(samples * POLL_MS)
+
+    # Warm up: first calls create stats entries and the like
+    for _ in range(3):
+        event = sched._next()
+        clock.ms = event[0]
+        sensor.update(clock.ms)
+        sched._fire(event, clock.ticks_ms())
+
+    start_free = gc.mem_free()
+    with heap:
+        for _ in range(samples):
+            event = sched._next()
+            if event[1] > 0 and sched._blocked(event, event[0]):
+                break
+            clock.ms = event[0]
+            sensor.update(clock.ms)
+            sched._fire(event, clock.ticks_ms())
+    allocated = start_free - gc.mem_free()
+    guard.end_window()
+    return hits[:hit_count], allocated
+
+
+class FirstHit(hostsim.Simulation):
+    """Runs code.py until a hit of an input phase (practice: with its hit handler)."""
+
+    def __init__(self, practice):
+        overrides = {"PRACTICE_MODE": "True"} if practice else {}
+        super().__init__(player=hostsim.Player(along=practice), rounds=0, quiet=True,
+                         overrides=overrides)
+        self.practice = practice
+        self.stopping = True
+
+    def _event(self, name, value):
+        super()._event(name, value)
+        ns = self.namespace
+        if self.stopping and name == "shake" and ns["listening"] and \
+                (ns["hit_handler"] is not None) == self.practice:
+            self.stopping = False
+            raise hostsim.SimulationEnd("first hit")
+
+
+def run_game(samples, practice=False):
+    """
+    code.py's own sample(), as its IMU task fires it: code.py runs under
+    hostsim up to its first hit of an input phase, then imu_sched fires
+    `samples` more polls, with a strike every STRIKE_EVERY_MS. Returns
+    (hits, bytes allocated while sampling).
+    """
+    sim = FirstHit(practice)
+    result = sim.run()
+    if result.reason != "first hit":
+        raise SystemExit(f"alloc_check: code.py never reached an input phase ({result.reason})")
+    ns = result.namespace
+    clock = sim.clock
+    sched = ns["imu_sched"]
+    t = clock.ms + STRIKE_EVERY_MS
+    while t < clock.ms + (samples + 10) * ns["SENSOR_POLL_MS"]:
+        sim.player.strike(t)
+        t += STRIKE_EVERY_MS
+    ns["hit_count"] = 0
+    detections = len(sim.detections)
+
+    def poll():
+        event = sched._next()
+        clock.ns = max(clock.ns, int(sim._to_virtual_ms(event[0]) * 1e6))
+        sched._fire(event, ns["ticks_ms"]())
+
+    for _ in range(3):
+        poll()
+    start_free = gc.mem_free()
+    with heap:
+        for _ in range(samples):
+            poll()
+    return len(sim.detections) - detections, start_free - gc.mem_free()
+
+
+def run_log(records):
+    """Bytes allocated by `records` ring-log calls like the beat callback's."""
+    log = RingLog(64, DEBUG)
+    log.debug("Beat {} at t={:.2f}", 0, 0.0)
+    start_free = gc.mem_free()
+    with heap:
+        for n in range(records):
+            log.debug("Beat {} at t={:.2f}", n, n * 0.5)
+    allocated = start_free - gc.mem_free()
+    log.flush(write=lambda text: None)
+    return allocated
+
+
+def run_voices(plays):
+    """Bytes allocated by `plays` feedback sounds started like sample() does."""
+    voices = VoiceManager([FakeVoice(), FakeVoice()], {"pattern": (0, 1.0), "feedback": (1, 0.8)})
+    bank = FeedbackBank(array.array("h", range(64)), 16000)
+    voices.play(bank.pick(0.0), "feedback")
+    start_free = gc.mem_free()
+    with heap:
+        for n in range(plays):
+            strength = 0.1 * (n % 4)     # every variant
+            voices.play(bank.pick(strength), "feedback")
+    return start_free - gc.mem_free()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=2000, help="IMU polls to simulate")
+    parser.add_argument("--verbose", action="store_true", help="list allocation sites")
+    args = parser.parse_args(argv)
+
+    heap.sites.clear()
+    old_hits, old_bytes = run_path(args.samples, new_path=False)
+    old_sites = dict(heap.sites)
+    heap.sites.clear()
+    new_hits, new_bytes = run_path(args.samples, new_path=True)
+    heap.sites.clear()
+    game = {}
+    for practice in (False, True):
+        game[practice] = run_game(args.samples, practice)
+    game_sites = dict(heap.sites)
+
+    n = args.samples
+    print(f"{n} IMU polls ({GRAVITY} m/s^2 gravity)\n")
+    for practice, label in ((False, "input phase"), (True, "practice")):
+        hits, nbytes = game[practice]
+        print(f"  {'code.py sample(), ' + label + ':':<36s}{nbytes:7d} bytes  ({hits} hits)")
+    print("\nIMU read + detection only:")
+    print(f"  icm.acceleration/gyro + update():  {old_bytes:7d} bytes  ({old_bytes / n:.0f} per sample)")
+    print(f"  BurstReader + update_motion():     {new_bytes:7d} bytes  ({new_bytes / n:.0f} per sample)")
+    same = old_hits == new_hits
+    print(f"  same decisions: {same} ({len(new_hits)} hits)\n")
+    heap.sites.clear()
+    log_bytes = run_log(n)
+    print(f"  RingLog.debug() x{n}:              {log_bytes:7d} bytes")
+    voice_bytes = run_voices(n)
+    print(f"  FeedbackBank.pick() + play() x{n}: {voice_bytes:7d} bytes")
+
+    game_bytes = sum(nbytes for _, nbytes in game.values())
+    if args.verbose or game_bytes or new_bytes:
+        for title, sites in (("old path", old_sites), ("code.py sample()", game_sites)):
+            if not sites:
+                continue
+            print(f"\nAllocation sites, {title}:")
+            for (path, line, what), nbytes in sorted(sites.items(), key=lambda kv: -kv[1]):
+                print(f"  {path}:{line:<5d} {what:<22s} {nbytes:7d} bytes")
+
+    ok = game_bytes == 0 and new_bytes == 0 and log_bytes == 0 and voice_bytes == 0 and same
+    print("\nOK: the hot path does not allocate." if ok else "\nFAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
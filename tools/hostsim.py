@@ -0,0 +1,969 @@
+"""
+Host simulator: runs the unmodified code.py on a computer, faster than
+real time.
+
+Fake board, displayio, audioio/audiocore/audiomixer, fourwire,
+adafruit_st7789, terminalio, adafruit_display_text, adafruit_icm20x,
+digitalio, microcontroller and supervisor modules are installed for the run, plus a
+virtual-time asyncio. Every clock code.py can see (time.monotonic,
+time.sleep, supervisor.ticks_ms) reads one virtual clock. Sleeping just
+moves it forward, so a 5-minute session takes a few seconds.
+
+A modelled player drives the IMU:
+  - shakes the baton during boot, so calibration has peaks to use,
+  - repeats each pattern after it plays (or plays along in practice mode),
+    with timing jitter,
+  - optionally shakes to skip result screens.
+The player reads the pattern from the clap schedule, like someone who
+already knows the level. Rounds, scheduled claps and detections come from
+code.py's events (events.py); which sound is playing is worked out from
+the audio handed to the fake hardware, so no game class is patched. Ring
+streams (ring.py) are read from their buffer as virtual time passes, so
+the claps logged for a pattern are the ones its ring actually held.
+
+    python tools/hostsim.py
+    python tools/hostsim.py --rounds 20 --jitter 60 --quiet
+    python tools/hostsim.py --set PRACTICE_MODE=True --rounds 3
+    python tools/hostsim.py --calibration 0 --skip-results
+    python tools/hostsim.py --assets optimized     # try optimize_audio.py output
+    python tools/hostsim.py --uptime 149.125       # ticks_ms wraps 20 s in
+
+Other tools import it: Simulation(...).run() returns a SimResult with the
+console transcript, audio starts, strikes and detections on the virtual
+timebase.
+"""
+
+import argparse
+import array
+import bisect
+import builtins
+import heapq
+import itertools
+import math
+import os
+import random
+import re
+import sys
+import time as real_time
+import types
+import wave
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TICKS_PERIOD = 1 << 29
+ASSET_DIRS = ("", "sounds", "image")
+
+# Game modules re-imported fresh for every run (they hold state and bind
+# time / supervisor at import)
+GAME_MODULES = ("timebase", "scheduler", "detector", "levels", "difficulty",
+                "profiler", "gcguard", "imu", "ringlog", "boottrace", "sounds", "patterns", "synth",
+                "mulaw", "feedback", "buffers", "events", "ring")
+
+# What CircuitPython calls cost on the device, in virtual microseconds.
+# Everything else is free; tune these to model a slower or faster board.
+COSTS_US = {
+    "clock": 20,          # each time / ticks read (keeps busy loops moving)
+    "imu_read": 400,      # one 12-byte I2C burst at 400 kHz
+    "audio_play": 150,    # AudioOut.play() until samples flow
+    "audio_stop": 50,
+    "voice_play": 40,     # MixerVoice.play(); the sound starts with a later mixer buffer
+    "flash_read": 300,    # first buffer of a WaveFile, read from flash when it starts
+}
+
+_print = builtins.print
+
+
+class SimulationEnd(Exception):
+    pass
+
+
+# ============================================================
+# VIRTUAL CLOCK
+# ============================================================
+
+class VirtualClock:
+    def __init__(self, limit_s=None, costs=None, uptime_ms=0):
+        self.ns = 0                 # since the simulation started
+        self.boot_ns = uptime_ms * 1_000_000    # how long the board was up by then
+        self.costs = dict(COSTS_US, **(costs or {}))
+        self.limit_ns = None if limit_s is None else int(limit_s * 1e9)
+        self.on_advance = None      # called after the clock moves, if set
+
+    def advance(self, ns):
+        if ns > 0:
+            self.ns += int(ns)
+            if self.on_advance is not None:
+                self.on_advance()
+            if self.limit_ns is not None and self.ns > self.limit_ns:
+                raise SimulationEnd("virtual time limit")
+
+    def cost(self, what):
+        self.advance(self.costs[what] * 1000)
+
+    @property
+    def ms(self):
+        return self.ns / 1e6
+
+    # --- what code.py sees ---
+    def monotonic(self):
+        self.cost("clock")
+        return (self.boot_ns + self.ns) / 1e9
+
+    def monotonic_ns(self):
+        self.cost("clock")
+        return self.boot_ns + self.ns
+
+    def sleep(self, seconds):
+        self.advance(seconds * 1e9)
+
+    def ticks_ms(self):
+        self.cost("clock")
+        return self.ticks_now()
+
+    def ticks_now(self):
+        """ticks_ms() without the cost of reading it."""
+        return ((self.boot_ns + self.ns) // 1_000_000) % TICKS_PERIOD
+
+
+# ============================================================
+# VIRTUAL-TIME ASYNCIO (the subset code.py uses)
+# ============================================================
+
+class _Sleep:
+    __slots__ = ("ns",)
+
+    def __init__(self, ns):
+        self.ns = ns
+
+    def __await__(self):
+        yield self
+
+
+class _Park:
+    """Suspend the task until Event.set() reschedules it."""
+
+    def __init__(self, event):
+        self.event = event
+
+    def __await__(self):
+        yield self
+
+
+class VirtualAsyncio:
+    def __init__(self, clock):
+        self.clock = clock
+        self.queue = []
+        self.seq = itertools.count()
+        self.current = None
+        module = self.module = types.ModuleType("asyncio")
+        loop = self
+
+        class Event:
+            def __init__(self):
+                self._set = False
+                self._waiting = []
+
+            def set(self):
+                self._set = True
+                for task in self._waiting:
+                    loop._push(task, loop.clock.ns)
+                self._waiting = []
+
+            def clear(self):
+                self._set = False
+
+            def is_set(self):
+                return self._set
+
+            async def wait(self):
+                if not self._set:
+                    await _Park(self)
+                return True
+
+        class Task:
+            def __init__(self, coro):
+                self.coro = coro
+                self.done = False
+                self.result = None
+                self.awaiting = []
+
+            def cancel(self):
+                self.done = True
+
+            def __await__(self):
+                if not self.done:
+                    self.awaiting.append(loop.current)
+                    yield None
+                return self.result
+
+        def create_task(coro):
+            task = Task(coro)
+            loop._push(task, loop.clock.ns)
+            return task
+
+        module.Event = Event
+        module.Task = Task
+        module.create_task = create_task
+        module.sleep = lambda s: _Sleep(int(s * 1e9))
+        module.sleep_ms = lambda ms: _Sleep(int(ms * 1e6))
+        module.run = lambda coro: loop.run(Task(coro))
+
+        async def gather(*aws):
+            return [await aw for aw in aws]
+        module.gather = gather
+
+    def _push(self, task, when):
+        heapq.heappush(self.queue, (when, next(self.seq), task))
+
+    def run(self, main):
+        self._push(main, self.clock.ns)
+        while self.queue:
+            when, _, task = heapq.heappop(self.queue)
+            if task.done:
+                continue
+            if when > self.clock.ns:
+                self.clock.advance(when - self.clock.ns)
+            self.current = task
+            try:
+                request = task.coro.send(None)
+            except StopIteration as stop:
+                task.done = True
+                task.result = stop.value
+                for waiter in task.awaiting:
+                    self._push(waiter, self.clock.ns)
+                if task is main:
+                    return stop.value
+                continue
+            if isinstance(request, _Sleep):
+                self._push(task, self.clock.ns + max(request.ns, 0))
+            elif isinstance(request, _Park):
+                request.event._waiting.append(task)
+            # None: parked on another task, resumed when it finishes
+        return None
+
+
+# ============================================================
+# PLAYER AND SENSOR MODEL
+# ============================================================
+
+STRIKE_MS = 50      # accel pulse of a strike (half sine)
+SWING_MS = 120      # gyro pulse of the swing leading into it
+GYRO_PER_G = 3.0    # rad/s of swing per g of strike
+GRAVITY = 9.80665
+
+
+class StrikeTrace:
+    """
+    A recorded strike, replayed in place of the modelled pulse. CSV with
+    a header row and columns t_ms,ax,ay,az,gx,gy,gz (m/s^2, rad/s), with
+    t_ms = 0 at the moment of impact, as logged from the device.
+    """
+
+    def __init__(self, path):
+        self.t, self.extra_g, self.spin = [], [], []
+        with open(path, encoding="utf-8") as f:
+            next(f)
+            for row in f:
+                if not row.strip():
+                    continue
+                t, ax, ay, az, gx, gy, gz = (float(v) for v in row.split(","))
+                self.t.append(t)
+                self.extra_g.append(math.sqrt(ax*ax + ay*ay + az*az) / GRAVITY - 1)
+                self.spin.append(math.sqrt(gx*gx + gy*gy + gz*gz))
+        self.before = max(0.0, -self.t[0])   # ms of swing before impact
+        self.after = self.t[-1]              # ms of signal after impact
+
+    def at(self, dt):
+        """(extra g, spin) dt ms after impact, linearly interpolated."""
+        t = self.t
+        i = bisect.bisect_right(t, dt)
+        if i == 0 or i == len(t):
+            return 0.0, 0.0
+        w = (dt - t[i - 1]) / (t[i] - t[i - 1])
+        return (self.extra_g[i - 1] + w * (self.extra_g[i] - self.extra_g[i - 1]),
+                self.spin[i - 1] + w * (self.spin[i] - self.spin[i - 1]))
+
+
+class Player:
+    """
+    Turns what the game does into baton strikes (virtual ms).
+    Also the IMU: motion(t) is what the sensor reads at time t.
+    """
+
+    def __init__(self, seed=1, jitter_ms=30.0, reaction_ms=400.0, strength=2.5,
+                 noise_g=0.03, calibration_s=4.0, skip_results_ms=None, along=False,
+                 trace=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.trace = trace           # StrikeTrace replayed for every strike, or None
+        self.jitter_ms = jitter_ms
+        self.reaction_ms = reaction_ms
+        self.strength = strength
+        self.noise_g = noise_g
+        self.skip_results_ms = skip_results_ms
+        self.along = along
+        self.strikes = []        # sorted virtual ms
+        self.pending = []        # beats (virtual ms) scheduled since the last plan
+        # Shake during boot: start screen + calibration
+        t = 300.0
+        while t < calibration_s * 1000:
+            self.strike(t)
+            t += 350.0
+
+    def strike(self, t):
+        bisect.insort(self.strikes, t)
+
+    def beats_scheduled(self, beats):
+        """A batch of claps was scheduled (virtual ms)."""
+        self.pending.extend(beats)
+
+    def _plan(self):
+        beats = sorted(self.pending)
+        self.pending = []
+        jitter = self.jitter_ms
+        if self.along:
+            for b in beats:
+                self.strike(b + self.rng.gauss(0, jitter))
+            return
+        first, last = beats[0], beats[-1]
+        start = last + self.reaction_ms
+        for b in beats:
+            self.strike(start + (b - first) + self.rng.gauss(0, jitter))
+
+    def round_over(self, now):
+        if self.skip_results_ms is not None:
+            self.strike(now + self.skip_results_ms)
+
+    def motion(self, t):
+        """(ax, ay, az) m/s^2 and (gx, gy, gz) rad/s at virtual ms t."""
+        if self.pending:
+            self._plan()
+        extra_g = 0.0
+        spin = 0.0
+        strikes = self.strikes
+        trace = self.trace
+        before, after = (trace.before, trace.after) if trace else (SWING_MS, STRIKE_MS)
+        i = bisect.bisect_left(strikes, t - after)
+        while i < len(strikes) and strikes[i] <= t + before:
+            dt = t - strikes[i]
+            if trace:
+                pulse_g, pulse_spin = trace.at(dt)
+                extra_g += pulse_g
+                spin += pulse_spin
+            elif 0 <= dt < STRIKE_MS:
+                extra_g += self.strength * math.sin(math.pi * dt / STRIKE_MS)
+            elif -SWING_MS <= dt < 0:
+                spin += self.strength * GYRO_PER_G * math.sin(math.pi * (dt + SWING_MS) / SWING_MS)
+            i += 1
+        n = self.noise_g * GRAVITY
+        g = self.rng.gauss
+        accel = (g(0, n), g(0, n), GRAVITY * (1 + extra_g) + g(0, n))
+        gyro = (spin + g(0, n * 0.05), g(0, n * 0.05), g(0, n * 0.05))
+        return accel, gyro
+
+
+# ============================================================
+# FAKE CIRCUITPYTHON MODULES
+# ============================================================
+
+class Pin:
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"board.{self.name}"
+
+
+class AnyPins:
+    def __getattr__(self, name):
+        return Pin(name)
+
+
+class FakeI2CDevice:
+    """ICM20948 registers behind adafruit_bus_device's I2CDevice."""
+
+    def __init__(self, icm):
+        self.icm = icm
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def write_then_readinto(self, out_buffer, in_buffer, **kwargs):
+        sim = self.icm.sim
+        sim.clock.cost("imu_read")
+        (ax, ay, az), (gx, gy, gz) = sim.player.motion(sim.clock.ms)
+        sim.imu_reads += 1
+        accel_lsb = self.icm.AccelRange.lsb[self.icm.accelerometer_range]
+        gyro_lsb = self.icm.GyroRange.lsb[self.icm.gyro_range]
+        raw = [round(v / GRAVITY * accel_lsb) for v in (ax, ay, az)]
+        raw += [round(math.degrees(v) * gyro_lsb) for v in (gx, gy, gz)]
+        data = bytearray()
+        for v in raw:
+            data += (max(-32768, min(32767, v)) & 0xFFFF).to_bytes(2, "big")
+        start = out_buffer[0] - 0x2D
+        in_buffer[:] = data[start:start + len(in_buffer)]
+
+
+def _scaled_copy(buffer, known):
+    """True if 'buffer' is int(known * gain) for some gain (0 < gain < 1)."""
+    if len(buffer) != len(known) or buffer is known:
+        return False
+    peak = max(range(len(known)), key=lambda i: abs(known[i]))
+    if known[peak] == 0:
+        return False
+    gain = buffer[peak] / known[peak]
+    return 0 < gain < 1 and all(abs(b - k * gain) <= 1 for b, k in zip(buffer, known))
+
+
+def _copies(data, sound):
+    """Byte offsets of whole copies of 'sound' in 'data' (sample-aligned)."""
+    offsets = []
+    if len(sound) >= len(data):
+        return offsets
+    i = data.find(sound)
+    while i >= 0:
+        if i % 2 == 0:
+            offsets.append(i)
+            i = data.find(sound, i + len(sound))
+        else:
+            i = data.find(sound, i + 1)
+    return offsets
+
+
+class RingPlayback:
+    """What a looping ring sample has played so far, read from its buffer as it plays."""
+
+    def __init__(self, sample, started):
+        self.sample = sample
+        self.started = started      # virtual ms of its first frame
+        self.frames = 0
+        self.data = bytearray()
+
+    def play_until(self, t):
+        ring = self.sample.ring
+        due = int((t - self.started) * self.sample.sample_rate / 1000)
+        while self.frames < due:
+            pos = self.frames % len(ring)
+            n = min(due - self.frames, len(ring) - pos)
+            self.data += ring[pos:pos + n].tobytes()
+            self.frames += n
+
+
+class FakeSample:
+    """What audiocore returns: enough to know how long it plays."""
+
+    def __init__(self, name, frames, sample_rate, channel_count=1, bits_per_sample=16,
+                 streamed=False, ring=None):
+        self.name = name
+        self.streamed = streamed    # WaveFile: starting it reads flash
+        self.ring = ring            # single_buffer=False: the buffer code.py keeps refilling
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.channel_count = channel_count
+        self.bits_per_sample = bits_per_sample
+
+    @property
+    def duration_ms(self):
+        return 1000.0 * self.frames / self.sample_rate
+
+    def deinit(self):
+        pass
+
+
+def build_modules(sim):
+    clock = sim.clock
+    mods = {}
+
+    def module(name, **attrs):
+        m = types.ModuleType(name)
+        m.__dict__.update(attrs)
+        mods[name] = m
+        return m
+
+    module("time", monotonic=clock.monotonic, monotonic_ns=clock.monotonic_ns,
+           sleep=clock.sleep, time=clock.monotonic)
+    module("supervisor", ticks_ms=clock.ticks_ms)
+    mods["asyncio"] = sim.asyncio.module
+
+    board = module("board", I2C=lambda: "i2c", LCD_SPI=lambda: "spi")
+    for name in ("DAC", "D4", "LCD_CS", "A0", "A1"):
+        setattr(board, name, Pin(name))
+
+    module("microcontroller", pin=AnyPins(), nvm=bytearray(256))
+
+    class Direction:
+        INPUT = "input"
+        OUTPUT = "output"
+
+    class DigitalInOut:
+        def __init__(self, pin):
+            self.pin = pin
+            self.direction = Direction.INPUT
+            self.value = False
+    module("digitalio", DigitalInOut=DigitalInOut, Direction=Direction)
+
+    # --- IMU ---
+    class RangeTable:
+        def __init__(self, **lsb):
+            self.lsb = {}
+            for i, (name, value) in enumerate(lsb.items()):
+                setattr(self, name, i)
+                self.lsb[i] = value
+
+    AccelRange = RangeTable(RANGE_2G=16384, RANGE_4G=8192, RANGE_8G=4096, RANGE_16G=2048)
+    GyroRange = RangeTable(RANGE_250_DPS=131.0, RANGE_500_DPS=65.5,
+                           RANGE_1000_DPS=32.8, RANGE_2000_DPS=16.4)
+
+    class ICM20948:
+        def __init__(self, i2c, address=0x69):
+            self.sim = sim
+            self.AccelRange = AccelRange
+            self.GyroRange = GyroRange
+            self.accelerometer_range = AccelRange.RANGE_2G
+            self.gyro_range = GyroRange.RANGE_250_DPS
+            self.i2c_device = FakeI2CDevice(self)
+
+        @property
+        def acceleration(self):
+            clock.cost("imu_read")
+            return sim.player.motion(clock.ms)[0]
+
+        @property
+        def gyro(self):
+            clock.cost("imu_read")
+            return sim.player.motion(clock.ms)[1]
+    module("adafruit_icm20x", ICM20948=ICM20948, AccelRange=AccelRange, GyroRange=GyroRange)
+
+    # --- audio ---
+    class AudioOut:
+        def __init__(self, pin, **kwargs):
+            self.sample = None
+            self.loop = False
+            self.started = 0.0
+
+        @property
+        def playing(self):
+            return self.sample is not None and (
+                self.loop or clock.ms < self.started + self.sample.duration_ms)
+
+        def play(self, sample, loop=False):
+            clock.cost("audio_play")
+            if getattr(sample, "streamed", False):
+                clock.cost("flash_read")
+            if self.sample is not None and not isinstance(self.sample, Mixer):
+                sim.sound_stopped(self.sample)
+            self.sample = sample
+            self.loop = loop
+            self.started = clock.ms
+            if isinstance(sample, Mixer):
+                sample.output_started = clock.ms
+            else:
+                sim.sound_started(clock.ms, sample)
+
+        def stop(self):
+            clock.cost("audio_stop")
+            if self.sample is not None and not isinstance(self.sample, Mixer):
+                sim.sound_stopped(self.sample)
+            self.sample = None
+
+        def deinit(self):
+            pass
+    module("audioio", AudioOut=AudioOut)
+
+    class MixerVoice:
+        def __init__(self, mixer):
+            self.mixer = mixer
+            self.sample = None
+            self.loop = False
+            self.started = 0.0
+            self.level = 1.0
+
+        @property
+        def playing(self):
+            return self.sample is not None and (
+                self.loop or clock.ms < self.started + self.sample.duration_ms)
+
+        def play(self, sample, loop=False):
+            mixer = self.mixer
+            if (sample.sample_rate, sample.channel_count, sample.bits_per_sample) != \
+                    (mixer.sample_rate, mixer.channel_count, mixer.bits_per_sample):
+                raise ValueError(f"{sample.name}: format does not match the mixer")
+            clock.cost("voice_play")
+            if sample.streamed:
+                clock.cost("flash_read")
+            if self.sample is not None:
+                sim.sound_stopped(self.sample)
+            self.sample = sample
+            self.loop = loop
+            self.started = mixer.next_buffer_ms()
+            sim.sound_started(self.started, sample)
+
+        def stop(self):
+            if self.sample is not None:
+                sim.sound_stopped(self.sample)
+            self.sample = None
+
+    class Mixer:
+        """
+        Double-buffered: a voice started now is mixed into the buffer after
+        the one already queued, so it is heard at the next buffer boundary
+        plus one buffer.
+        """
+
+        def __init__(self, voice_count=2, buffer_size=1024, channel_count=2,
+                     bits_per_sample=16, samples_signed=True, sample_rate=8000):
+            self.sample_rate = sample_rate
+            self.channel_count = channel_count
+            self.bits_per_sample = bits_per_sample
+            self.buffer_ms = 1000.0 * buffer_size / (channel_count * bits_per_sample // 8) / sample_rate
+            self.voice = [MixerVoice(self) for _ in range(voice_count)]
+            self.output_started = None
+
+        def next_buffer_ms(self):
+            if self.output_started is None:   # not connected to an AudioOut yet
+                return clock.ms
+            since = clock.ms - self.output_started
+            return self.output_started + (math.floor(since / self.buffer_ms) + 2) * self.buffer_ms
+
+        @property
+        def playing(self):
+            return True
+    module("audiomixer", Mixer=Mixer, MixerVoice=MixerVoice)
+
+    def WaveFile(f, buffer=None):
+        name = os.path.basename(getattr(f, "name", "wav"))
+        pos = f.tell()
+        with wave.open(f, "rb") as w:
+            sample = FakeSample(name, w.getnframes(), w.getframerate(),
+                                w.getnchannels(), 8 * w.getsampwidth(), streamed=True)
+        f.seek(pos)
+        return sample
+
+    def RawSample(buffer, *, channel_count=1, sample_rate=8000, single_buffer=True):
+        bits = 8 * getattr(buffer, "itemsize", 1)
+        if not single_buffer:   # a ring stream: what it plays is read as it plays
+            return FakeSample(sim.last_opened, len(buffer) // channel_count, sample_rate,
+                              channel_count, bits, ring=buffer)
+        return FakeSample(sim.identify(buffer, sample_rate), len(buffer) // channel_count,
+                          sample_rate, channel_count, bits)
+    module("audiocore", WaveFile=WaveFile, RawSample=RawSample)
+
+    # --- display ---
+    class Group(list):
+        def __init__(self, *, scale=1, x=0, y=0):
+            super().__init__()
+            self.scale, self.x, self.y = scale, x, y
+            self.hidden = False
+
+    class Palette(list):
+        def __init__(self, n):
+            super().__init__([0] * n)
+
+    class Bitmap:
+        def __init__(self, width, height, value_count):
+            self.width, self.height = width, height
+
+    class OnDiskBitmap:
+        def __init__(self, f):
+            self.file = f
+            self.pixel_shader = Palette(1)
+
+    class TileGrid:
+        def __init__(self, bitmap, *, pixel_shader=None, **kwargs):
+            self.bitmap = bitmap
+            self.pixel_shader = pixel_shader
+            self.hidden = False
+            self.x = kwargs.get("x", 0)
+            self.y = kwargs.get("y", 0)
+
+    module("displayio", Group=Group, Palette=Palette, Bitmap=Bitmap, OnDiskBitmap=OnDiskBitmap,
+           TileGrid=TileGrid, release_displays=lambda: None)
+    module("fourwire", FourWire=lambda spi, **kwargs: ("fourwire", spi))
+
+    class ST7789:
+        def __init__(self, bus, **kwargs):
+            self.width = kwargs.get("width")
+            self.height = kwargs.get("height")
+            self.root_group = None
+            self.auto_refresh = True
+
+        def refresh(self, **kwargs):
+            return True
+    module("adafruit_st7789", ST7789=ST7789)
+    module("terminalio", FONT="terminalio.FONT")
+
+    class Label:
+        def __init__(self, font, *, text="", color=0xFFFFFF, scale=1, **kwargs):
+            self.font, self.text, self.color, self.scale = font, text, color, scale
+            self.anchor_point = (0, 0)
+            self.anchored_position = (0, 0)
+            self.hidden = False
+    label = module("adafruit_display_text.label", Label=Label)
+    module("adafruit_display_text", label=label)
+    return mods
+
+
+# ============================================================
+# SIMULATION
+# ============================================================
+
+class SimResult:
+    def __init__(self, sim, wall_s, reason):
+        self.lines = sim.lines                  # (virtual ms, text)
+        self.audio_starts = sim.audio_starts    # (virtual ms, sample name)
+        self.strikes = sim.player.strikes       # virtual ms
+        self.detections = sim.detections        # virtual ms of every detected shake
+        self.scheduled_beats = sim.scheduled_beats  # virtual ms each clap was scheduled for
+        self.rounds = sim.rounds
+        self.virtual_s = sim.clock.ns / 1e9
+        self.wall_s = wall_s
+        self.reason = reason
+        self.namespace = sim.namespace
+        self.scores = [int(m.group(1)) for _, text in self.lines
+                       for m in [re.match(r"(?:Practice s|S)core: (\d+)%", text)] if m]
+
+
+class Simulation:
+    def __init__(self, player=None, rounds=5, seconds=None, overrides=None, quiet=False,
+                 code_path=None, costs=None, asset_dir=None, uptime_ms=0):
+        self.clock = VirtualClock(seconds, costs, uptime_ms)
+        self.asyncio = VirtualAsyncio(self.clock)
+        overrides = dict(overrides or {})
+        along = overrides.get("PRACTICE_MODE", "False") == "True"
+        self.player = player or Player(along=along)
+        self.max_rounds = rounds
+        self.overrides = overrides
+        self.quiet = quiet
+        self.code_path = code_path or os.path.join(ROOT, "code.py")
+        # Where the board's files are looked up; asset_dir (e.g. optimized
+        # sounds) shadows the repo's
+        self.asset_dirs = [os.path.join(ROOT, d) for d in ASSET_DIRS]
+        if asset_dir:
+            self.asset_dirs.insert(0, asset_dir)
+        self.lines = []
+        self.audio_starts = []
+        self.detections = []
+        self.scheduled_beats = []
+        self.rounds = 0
+        self.imu_reads = 0
+        self._pcm_names = None
+        self.known = []             # (name, array) of the buffers identified so far
+        self.last_opened = None     # name of the last file code.py opened
+        self.rings = []             # RingPlayback of the ring streams playing
+        self.namespace = None
+
+    # --- hooks into the run ---
+    def _print(self, *args, sep=" ", end="\n", file=None, flush=False):
+        if file not in (None, sys.stdout):
+            return _print(*args, sep=sep, end=end, file=file)
+        text = sep.join(str(a) for a in args)
+        for line in text.split("\n"):
+            self.lines.append((self.clock.ms, line))
+        if not self.quiet:
+            stamp = f"[{self.clock.ms / 1000:8.3f}]"
+            for line in text.split("\n"):
+                _print(stamp, line)
+
+    def _event(self, name, value):
+        """events.hook: the milestones code.py reports."""
+        if name == "beat":
+            t = self._to_virtual_ms(value)
+            self.scheduled_beats.append(t)
+            self.player.beats_scheduled([t])
+        elif name == "shake":
+            self.detections.append(self.clock.ms)
+        elif name == "round_end":
+            self.rounds += 1
+            self.player.round_over(self.clock.ms)
+            if self.max_rounds and self.rounds >= self.max_rounds:
+                raise SimulationEnd(f"{self.rounds} rounds")
+
+    def _open(self, path, mode="r", *args, **kwargs):
+        name = os.path.basename(path)
+        for d in self.asset_dirs:
+            candidate = os.path.join(d, name)
+            if os.path.exists(candidate):
+                self.last_opened = name
+                return open(candidate, mode, *args, **kwargs)
+        raise OSError(2, "No such file/directory", path)
+
+    def sound_started(self, t, sample):
+        """Log an audio start; a ring stream is logged once it stops."""
+        if sample.ring is None:
+            self.audio_starts.append((t, sample.name))
+            return
+        self.rings.append(RingPlayback(sample, t))
+        self.clock.on_advance = self._play_rings
+
+    def sound_stopped(self, sample):
+        """A voice let go of 'sample': log what a ring stream played."""
+        for playback in self.rings:
+            if playback.sample is sample:
+                self._play_rings()
+                self.rings.remove(playback)
+                self._log_ring(playback)
+                break
+        if not self.rings:
+            self.clock.on_advance = None
+
+    def _play_rings(self):
+        for playback in self.rings:
+            playback.play_until(self.clock.ms)
+
+    def _log_ring(self, playback):
+        """
+        A ring stream that played copies of a known sound (a pattern) is
+        logged as one start per copy, else as a start of the file it plays.
+        """
+        sample = playback.sample
+        data = bytes(playback.data)
+        for name, known in self.known:
+            offsets = _copies(data, bytes(known))
+            if offsets:
+                for o in offsets:
+                    self.audio_starts.append(
+                        (playback.started + o // 2 * 1000 / sample.sample_rate, name))
+                return
+        self.audio_starts.append((playback.started, sample.name))
+
+    def identify(self, buffer, sample_rate):
+        """
+        The name of audio handed to RawSample, from its content: a WAV
+        asset's data, a synthesized sound, or a gain-scaled copy of a known
+        sound (strike-strength feedback). Else "raw".
+        """
+        name = self.asset_name(buffer)
+        if name == "raw":
+            name = self._synth_name(buffer, sample_rate)
+        if name != "raw":
+            self.known.append((name, buffer))
+            return name
+        for name, known in self.known:
+            if _scaled_copy(buffer, known):
+                return name
+        return "raw"
+
+    def _synth_name(self, buffer, sample_rate):
+        # Sounds code.py synthesizes are logged under the WAV they replace
+        synth = sys.modules["synth"]
+        for name, params in (self.namespace or {}).get("SYNTH_SOUNDS", {}).items():
+            if synth.render(params, sample_rate) is buffer:
+                return name + ".wav"
+        return "raw"
+
+    def asset_name(self, buffer):
+        """The WAV whose audio data 'buffer' holds (audio starts are logged by name)."""
+        if self._pcm_names is None:
+            self._pcm_names = {}
+            sounds, mulaw = sys.modules["sounds"], sys.modules["mulaw"]
+            for d in reversed(self.asset_dirs):    # earlier directories win
+                for name in sorted(os.listdir(d)):
+                    if not name.endswith(".wav"):
+                        continue
+                    with open(os.path.join(d, name), "rb") as f:
+                        fmt, _, _, _, data_bytes = sounds.read_wav_format(f)
+                        data = f.read(data_bytes)
+                    if fmt == mulaw.WAVE_FORMAT_MULAW:   # as decoded into RAM
+                        data = array.array("h", [mulaw.DECODE[b] for b in data]).tobytes()
+                    self._pcm_names[data] = name
+        return self._pcm_names.get(bytes(buffer), "raw")
+
+    def _to_virtual_ms(self, ticks):
+        now = self.clock.ticks_now()
+        diff = (ticks - now) % TICKS_PERIOD
+        if diff >= TICKS_PERIOD // 2:
+            diff -= TICKS_PERIOD
+        return self.clock.ns // 1_000_000 + diff
+
+    def _source(self):
+        with open(self.code_path, encoding="utf-8") as f:
+            src = f.read()
+        for name, value in self.overrides.items():
+            pattern = re.compile(rf"^{re.escape(name)} = .*?(?=\s*(#|$))", re.M)
+            src, n = pattern.subn(f"{name} = {value}", src, count=1)
+            if not n:
+                raise SystemExit(f"hostsim: no top-level '{name} = ...' in {self.code_path}")
+        return src
+
+    def run(self):
+        saved = {name: sys.modules.get(name) for name in
+                 list(GAME_MODULES) + list(build_modules(self))}
+        fakes = build_modules(self)
+        wall_start = real_time.perf_counter()
+        reason = "finished"
+        try:
+            for name in GAME_MODULES:
+                sys.modules.pop(name, None)
+            sys.modules.update(fakes)
+            builtins.print = self._print
+            for name in GAME_MODULES:
+                __import__(name)
+                sys.modules[name].open = self._open   # assets live in sounds/ and image/
+            sys.modules["events"].hook = self._event
+            # The board seeds random from its hardware RNG; here the game's
+            # draws (the level selector's) follow the player's seed
+            random.seed(self.player.seed)
+            self.namespace = {"__name__": "__main__", "__file__": self.code_path,
+                              "open": self._open}
+            code = compile(self._source(), self.code_path, "exec")
+            exec(code, self.namespace)
+        except SimulationEnd as end:
+            reason = str(end)
+        finally:
+            for playback in self.rings[:]:
+                self.sound_stopped(playback.sample)
+            builtins.print = _print
+            for name, mod in saved.items():
+                if mod is None:
+                    sys.modules.pop(name, None)
+                else:
+                    sys.modules[name] = mod
+        return SimResult(self, real_time.perf_counter() - wall_start, reason)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="stop after this many rounds (0: no limit)")
+    parser.add_argument("--seconds", type=float, help="stop after this much virtual time")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--jitter", type=float, default=30.0, help="player timing jitter (ms, std dev)")
+    parser.add_argument("--reaction", type=float, default=400.0,
+                        help="ms from the last clap to the player's first hit")
+    parser.add_argument("--strength", type=float, default=2.5, help="strike strength (extra g)")
+    parser.add_argument("--calibration", type=float, default=4.0,
+                        help="seconds the player shakes during boot (0: never)")
+    parser.add_argument("--skip-results", type=float, metavar="MS",
+                        help="shake this long after each round to skip the result screen")
+    parser.add_argument("--strike-trace", metavar="CSV", help="replay this recorded strike (see StrikeTrace)")
+    parser.add_argument("--assets", metavar="DIR",
+                        help="look for the board's files here first (e.g. optimize_audio.py output)")
+    parser.add_argument("--uptime", type=float, default=0.0, metavar="HOURS",
+                        help="board uptime when the game starts (ticks_ms starts there)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a top-level constant in code.py (repeatable)")
+    parser.add_argument("--quiet", action="store_true", help="only print the summary")
+    args = parser.parse_args(argv)
+
+    overrides = dict(item.split("=", 1) for item in args.set)
+    player = Player(seed=args.seed, jitter_ms=args.jitter, reaction_ms=args.reaction,
+                    strength=args.strength, calibration_s=args.calibration,
+                    skip_results_ms=args.skip_results,
+                    along=overrides.get("PRACTICE_MODE") == "True",
+                    trace=StrikeTrace(args.strike_trace) if args.strike_trace else None)
+    result = Simulation(player, rounds=args.rounds, seconds=args.seconds,
+                        overrides=overrides, quiet=args.quiet, asset_dir=args.assets,
+                        uptime_ms=int(args.uptime * 3600 * 1000)).run()
+
+    speed = result.virtual_s / result.wall_s if result.wall_s else float("inf")
+    print(f"\nStopped: {result.reason}. Simulated {result.virtual_s:.1f} s in "
+          f"{result.wall_s:.2f} s ({speed:.0f}x real time).")
+    print(f"Rounds: {result.rounds}, scores: {result.scores}, "
+          f"strikes: {len(result.strikes)}, detections: {len(result.detections)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+End-to-end latency benchmark (runs on a computer, not the board).
+
+Runs code.py in the host simulator (tools/hostsim.py) under a few fixed
+configurations, with fixed seeds, and measures on the virtual timebase:
+
+  strike_to_detection   start of the player's swing -> ShakeDetector
+                        reports the shake
+  detection_to_audio    detection -> beat.wav starts playing
+  beat_to_clap          scheduled clap deadline -> clap-drum.wav starts
+  clap_interval_error   how much the gap between two claps of a pattern
+                        differs from the scheduled gap (|change in
+                        beat_to_clap|): the rhythm error the player hears
+
+Each metric is summarised as n / mean / p50 / p90 / p99 / max in ms. The
+JSON report contains only simulated results (no wall-clock times), so the
+same tree always gives the same file and two releases can be diffed:
+
+    python tools/latency_bench.py
+    python tools/latency_bench.py --json latency.json
+    python tools/latency_bench.py --compare latency-1.2.json
+    python tools/latency_bench.py --config default --strike-trace strike.csv
+
+--strike-trace replays a recorded strike (see hostsim.StrikeTrace)
+instead of the modelled one. Device costs (I2C read, AudioOut.play()...)
+come from hostsim.COSTS_US, overridden per configuration below.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import hostsim  # noqa: E402
+
+REPORT_FORMAT = 1
+MATCH_MS = 250      # a detection this long after no strike onset is a false one
+AUDIO_MATCH_MS = 50
+CLAP_MATCH_MS = 100
+SAME_PATTERN_MS = 2000  # claps closer than this belong to the same pattern
+METRICS = ("strike_to_detection", "detection_to_audio", "beat_to_clap", "clap_interval_error")
+
+# name -> description, code.py overrides, cost overrides (us), player options
+CONFIGS = {
+    "default": ("shipped settings", {}, {}, {}),
+    "poll-10ms": ("IMU polled every 10 ms", {"SENSOR_POLL_MS": "10"}, {}, {}),
+    "slow-i2c": ("IMU burst read takes 1.2 ms (100 kHz bus)", {}, {"imu_read": 1200}, {}),
+    "practice": ("practice mode, playing along", {"PRACTICE_MODE": "True"}, {}, {"along": True}),
+    "single-voice": ("no mixer: AudioOut stop/seek/play per sound", {"USE_MIXER": "False"}, {}, {}),
+    "clap-by-clap": ("patterns not pre-rendered", {"RENDER_PATTERNS": "False"}, {}, {}),
+}
+
+
+def stats(values):
+    """n / mean / nearest-rank percentiles / max, rounded to 0.01 ms."""
+    if not values:
+        return {"n": 0}
+    ordered = sorted(values)
+    n = len(ordered)
+
+    def pct(fraction):
+        return ordered[min(n - 1, max(0, int(fraction * n + 0.999999) - 1))]
+    return {"n": n,
+            "mean": round(sum(ordered) / n, 2),
+            "p50": round(pct(0.50), 2),
+            "p90": round(pct(0.90), 2),
+            "p99": round(pct(0.99), 2),
+            "max": round(ordered[-1], 2)}
+
+
+def strike_latencies(onsets, detections, after_ms):
+    """Pair each strike onset after after_ms with the first unused detection after it."""
+    latencies = []
+    used = set()
+    missed = 0
+    for strike in onsets:
+        if strike < after_ms:
+            continue
+        for i, det in enumerate(detections):
+            if i not in used and 0 <= det - strike <= MATCH_MS:
+                used.add(i)
+                latencies.append(det - strike)
+                break
+        else:
+            missed += 1
+    false = sum(1 for i, det in enumerate(detections) if det >= after_ms and i not in used)
+    return latencies, missed, false
+
+
+def follow_latencies(causes, effects, window_ms):
+    """For each effect, (cause, delay) from the latest cause at most window_ms before it."""
+    pairs = []
+    for effect in effects:
+        best = None
+        for cause in causes:
+            if 0 <= effect - cause <= window_ms:
+                best = cause
+        if best is not None:
+            pairs.append((best, effect - best))
+    return pairs
+
+
+def interval_errors(pairs):
+    """|change in delay| between consecutive claps of the same pattern."""
+    errors = []
+    pairs = sorted(pairs)
+    for (a, delay_a), (b, delay_b) in zip(pairs, pairs[1:]):
+        if b - a <= SAME_PATTERN_MS:
+            errors.append(abs(delay_b - delay_a))
+    return errors
+
+
+def run_config(name, rounds, seed, trace):
+    description, overrides, costs, player_options = CONFIGS[name]
+    player = hostsim.Player(seed=seed, trace=trace, **player_options)
+    result = hostsim.Simulation(player, rounds=rounds, overrides=overrides,
+                                quiet=True, costs=costs).run()
+
+    calibrated = next((t for t, text in result.lines if text.startswith("Calibration done")), 0.0)
+    swing_ms = trace.before if trace else hostsim.SWING_MS   # strikes are logged at impact
+    onsets = [t - swing_ms for t in result.strikes]
+    hits, missed, false = strike_latencies(onsets, result.detections, calibrated)
+
+    def starts(wav):
+        return [t for t, sample in result.audio_starts if sample == wav]
+
+    feedback = follow_latencies(result.detections, starts("beat.wav"), AUDIO_MATCH_MS)
+    claps = follow_latencies(result.scheduled_beats, starts("clap-drum.wav"), CLAP_MATCH_MS)
+    return {
+        "description": description,
+        "overrides": overrides,
+        "costs_us": dict(hostsim.COSTS_US, **costs),
+        "rounds": result.rounds,
+        "scores": result.scores,
+        "missed_strikes": missed,
+        "false_detections": false,
+        "metrics": {
+            "strike_to_detection": stats(hits),
+            "detection_to_audio": stats([delay for _, delay in feedback]),
+            "beat_to_clap": stats([delay for _, delay in claps]),
+            "clap_interval_error": stats(interval_errors(claps)),
+        },
+    }
+
+
+def print_report(report):
+    for name, config in report["configs"].items():
+        print(f"{name}: {config['description']} — rounds={config['rounds']} "
+              f"scores={config['scores']} missed={config['missed_strikes']} "
+              f"false={config['false_detections']}")
+        for metric in METRICS:
+            s = config["metrics"][metric]
+            if not s["n"]:
+                print(f"  {metric:20s} n=0")
+                continue
+            print(f"  {metric:20s} n={s['n']:<4d} mean={s['mean']:7.2f} p50={s['p50']:7.2f} "
+                  f"p90={s['p90']:7.2f} p99={s['p99']:7.2f} max={s['max']:7.2f} ms")
+
+
+def print_comparison(old, new):
+    print("\nChange against the baseline (ms, + = slower):")
+    for name, config in new["configs"].items():
+        base = old.get("configs", {}).get(name)
+        if base is None:
+            print(f"{name}: not in baseline")
+            continue
+        for metric in METRICS:
+            a, b = base["metrics"].get(metric, {"n": 0}), config["metrics"][metric]
+            if not a["n"] or not b["n"]:
+                print(f"  {name:10s} {metric:20s} n {a['n']} -> {b['n']}")
+                continue
+            deltas = " ".join(f"{key}={b[key] - a[key]:+7.2f}" for key in ("mean", "p90", "max"))
+            print(f"  {name:10s} {metric:20s} {deltas}")
+        for key in ("missed_strikes", "false_detections"):
+            if base[key] != config[key]:
+                print(f"  {name:10s} {key}: {base[key]} -> {config[key]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--config", action="append", choices=sorted(CONFIGS),
+                        help="run only this configuration (repeatable)")
+    parser.add_argument("--rounds", type=int, default=6, help="rounds per configuration")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--strike-trace", metavar="CSV", help="replay this recorded strike")
+    parser.add_argument("--json", metavar="PATH", help="write the report here")
+    parser.add_argument("--compare", metavar="PATH", help="print deltas against an earlier report")
+    args = parser.parse_args(argv)
+
+    trace = hostsim.StrikeTrace(args.strike_trace) if args.strike_trace else None
+    report = {
+        "format": REPORT_FORMAT,
+        "rounds": args.rounds,
+        "seed": args.seed,
+        "strike_trace": os.path.basename(args.strike_trace) if args.strike_trace else None,
+        "configs": {name: run_config(name, args.rounds, args.seed, trace)
+                    for name in (args.config or CONFIGS)},
+    }
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nWrote {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Generate rhythm levels from WAV files (runs on a computer, not the board).
+
+Onsets are found with spectral flux: the half-wave rectified frame-to-frame
+increase of the log magnitude spectrum, followed by adaptive peak picking.
+Everything is vectorized with NumPy, so whole songs take well under a second.
+
+Each detected onset list is cut into playable chunks and printed as
+`Level(...)` lines ready to paste into LEVELS in levels.py:
+
+    python tools/onset_levels.py sounds/*.wav
+    python tools/onset_levels.py song.wav --grid 0.25 --max-beats 7
+
+Requires numpy (pip install numpy).
+"""
+
+import argparse
+import glob
+import os
+import sys
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from detector import COOLDOWN_MS  # noqa: E402
+
+# Same limits the game plays with
+COOLDOWN = COOLDOWN_MS / 1000   # detect_shake() cannot register hits closer than this
+LEAD_IN = 0.5       # time of the first beat in a generated pattern
+MAX_BEATS = 7       # longest pattern in LEVELS
+MAX_LENGTH = 3.25   # seconds, longest pattern in LEVELS
+
+
+def read_wav(path):
+    """Return (mono float32 samples in [-1, 1], sample_rate)."""
+    with wave.open(path, "rb") as w:
+        channels = w.getnchannels()
+        width = w.getsampwidth()
+        rate = w.getframerate()
+        raw = w.readframes(w.getnframes())
+
+    if width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        data = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        data = ints.astype(np.float32) / 8388608
+    elif width == 4:
+        data = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"unsupported sample width {width}")
+
+    if channels > 1:
+        data = data.reshape(-1, channels).mean(axis=1)
+    return data, rate
+
+
+def spectral_flux(samples, rate, frame=1024, hop=None):
+    """Onset strength per frame and the frame rate (frames per second)."""
+    hop = hop or max(1, rate // 200)  # 5 ms hops
+    if len(samples) < frame:
+        samples = np.pad(samples, (0, frame - len(samples)))
+    # Pad half a frame at the front so frame i is centred on i * hop
+    padded = np.pad(samples, (frame // 2, frame // 2))
+    frames = sliding_window_view(padded, frame)[::hop]
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame), axis=1))
+    log_spec = np.log1p(100 * spectrum)
+    flux = np.maximum(np.diff(log_spec, axis=0, prepend=log_spec[:1]), 0).sum(axis=1)
+    peak = flux.max()
+    if peak > 0:
+        flux /= peak
+    return flux, rate / hop
+
+
+def pick_peaks(flux, fps, delta=0.07, window=0.05, mean_window=0.1, min_gap=COOLDOWN):
+    """Onset times (s): local maxima above a moving mean + delta, min_gap apart."""
+    w = max(1, int(window * fps))
+    m = max(1, int(mean_window * fps))
+
+    local_max = sliding_window_view(np.pad(flux, w, mode="edge"), 2 * w + 1).max(axis=1)
+    local_mean = sliding_window_view(np.pad(flux, m, mode="edge"), 2 * m + 1).mean(axis=1)
+    candidates = np.flatnonzero((flux == local_max) & (flux >= local_mean + delta))
+
+    # Greedy min-gap suppression, strongest first (few candidates; cheap)
+    order = candidates[np.argsort(-flux[candidates], kind="stable")]
+    gap = int(min_gap * fps)
+    taken = np.zeros(len(flux), dtype=bool)
+    keep = []
+    for i in order:
+        lo, hi = max(0, i - gap + 1), i + gap
+        if not taken[lo:hi].any():
+            taken[i] = True
+            keep.append(i)
+    return np.sort(np.asarray(keep, dtype=float)) / fps
+
+
+def merge_close(times, min_gap):
+    """Drop onsets closer than min_gap to the one kept before them."""
+    keep = []
+    for t in times:
+        if not keep or t - keep[-1] >= min_gap - 1e-9:
+            keep.append(t)
+    return np.asarray(keep, dtype=float)
+
+
+def quantize(times, grid, min_gap=COOLDOWN):
+    if not grid:
+        return times
+    q = np.unique(np.round(times / grid) * grid)
+    # rounding can pull neighbours under min_gap again (any grid < min_gap)
+    return merge_close(q, min_gap)
+
+
+def to_patterns(onsets, max_beats=MAX_BEATS, max_length=MAX_LENGTH, lead=LEAD_IN, min_beats=3):
+    """Cut an onset list into patterns that start at `lead` seconds."""
+    patterns = []
+    i = 0
+    while i < len(onsets):
+        start = onsets[i]
+        chunk = onsets[i:i + max_beats]
+        chunk = chunk[chunk - start <= max_length - lead]
+        if len(chunk) >= min_beats:
+            patterns.append([round(float(t - start + lead), 2) for t in chunk])
+        i += max(1, len(chunk))
+    return patterns
+
+
+def levels_for_file(path, args):
+    samples, rate = read_wav(path)
+    flux, fps = spectral_flux(samples, rate)
+    onsets = pick_peaks(flux, fps, delta=args.delta, min_gap=args.min_gap)
+    onsets = quantize(onsets, args.grid, args.min_gap)
+    return onsets, to_patterns(
+        onsets, max_beats=args.max_beats, max_length=args.max_length,
+        lead=args.lead, min_beats=args.min_beats,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("wavs", nargs="+", help="WAV files or glob patterns")
+    parser.add_argument("--delta", type=float, default=0.07, help="peak threshold above the local mean (0-1)")
+    parser.add_argument("--min-gap", type=float, default=COOLDOWN, help="minimum seconds between onsets")
+    parser.add_argument("--grid", type=float, default=0.0, help="quantize onsets to this grid (s), e.g. 0.25")
+    parser.add_argument("--lead", type=float, default=LEAD_IN, help="time of the first beat in each level")
+    parser.add_argument("--max-beats", type=int, default=MAX_BEATS)
+    parser.add_argument("--max-length", type=float, default=MAX_LENGTH)
+    parser.add_argument("--min-beats", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    paths = []
+    for pattern in args.wavs:
+        paths.extend(sorted(glob.glob(pattern)) or [pattern])
+
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            onsets, patterns = levels_for_file(path, args)
+        except (OSError, ValueError, wave.Error) as e:
+            print(f"# {path}: {e}", file=sys.stderr)
+            continue
+        print(f"# {path}: {len(onsets)} onsets, {len(patterns)} levels")
+        for n, pattern in enumerate(patterns, 1):
+            times = ", ".join(f"{t:.2f}" for t in pattern)
+            print(f'    Level("{name} {n}", [{times}]),')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Audio asset optimizer (runs on a computer, not the board).
+
+Converts WAVs to the format the game's audio mixer plays (mono, 16-bit
+signed, MIXER_SAMPLE_RATE from code.py), and:
+  - trims leading silence: it delays the sound after play(), so a beat or
+    clap with 20 ms of silence in front is heard 20 ms late,
+  - optionally trims trailing silence (--trim-tail),
+  - normalizes the peak level (--peak-db),
+  - with --mulaw, stores long sounds (MULAW_MIN_BYTES of PCM or more) as
+    μ-law WAVs: one byte per sample, half the flash, decoded on the board
+    by mulaw.py.
+
+It reports the flash saved and the onset offset removed per file, then
+loads every output through the game's own sounds.SoundRegistry to check
+that it plays (and whether it is small enough to be kept in RAM).
+
+    python tools/optimize_audio.py                          # sounds/*.wav -> optimized/
+    python tools/optimize_audio.py sounds/beat.wav --out /tmp/snd
+    python tools/optimize_audio.py --in-place --trim-tail
+    python tools/optimize_audio.py --dry-run
+    python tools/optimize_audio.py --in-place --mulaw       # boot, success, fail -> μ-law
+
+Requires numpy (pip install numpy).
+"""
+
+import argparse
+import glob
+import os
+import re
+import struct
+import sys
+import types
+import wave
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+
+from onset_levels import read_wav  # noqa: E402
+
+SILENCE_DB = -40.0   # below the file's peak; quieter samples at the ends are silence
+PRE_ROLL_MS = 2.0    # kept before the onset, faded in, so the attack is not clicked
+FADE_OUT_MS = 10.0   # fade at a trimmed tail
+PEAK_DB = -1.0       # normalized peak (dBFS)
+# --mulaw: shorter sounds stay PCM (kept in RAM, or streamed without a
+# decode); go.wav (21 KB) plays right before a round, where decoding
+# could delay the first clap
+MULAW_MIN_BYTES = 32 * 1024
+
+
+def mixer_sample_rate():
+    """MIXER_SAMPLE_RATE from code.py: every WAV must match the mixer."""
+    with open(os.path.join(ROOT, "code.py"), encoding="utf-8") as f:
+        m = re.search(r"^MIXER_SAMPLE_RATE = (\d+)", f.read(), re.M)
+    return int(m.group(1)) if m else 16000
+
+
+def resample(samples, rate, target):
+    """Windowed-sinc low-pass (when going down), then linear interpolation."""
+    if rate == target:
+        return samples
+    if target < rate:
+        cutoff = 0.45 * target / rate       # of the input rate, below the new Nyquist
+        taps = np.arange(-32, 33)
+        kernel = 2 * cutoff * np.sinc(2 * cutoff * taps) * np.hamming(len(taps))
+        samples = np.convolve(samples, kernel / kernel.sum(), mode="same")
+    n = int(round(len(samples) * target / rate))
+    return np.interp(np.arange(n) * rate / target, np.arange(len(samples)), samples)
+
+
+def trim(samples, rate, tail=False, silence_db=SILENCE_DB):
+    """(trimmed samples, leading ms removed, trailing ms removed)."""
+    peak = np.max(np.abs(samples)) if len(samples) else 0.0
+    if peak == 0:
+        return samples, 0.0, 0.0
+    loud = np.nonzero(np.abs(samples) >= peak * 10 ** (silence_db / 20))[0]
+    pre_roll = int(rate * PRE_ROLL_MS / 1000)
+    start = max(0, loud[0] - pre_roll)
+    end = len(samples)
+    if tail:
+        end = min(len(samples), loud[-1] + 1 + int(rate * FADE_OUT_MS / 1000))
+    out = samples[start:end].copy()
+    fade_in = min(loud[0] - start, len(out))
+    if fade_in > 0:
+        out[:fade_in] *= np.linspace(0, 1, fade_in, endpoint=False)
+    if tail:
+        fade = min(int(rate * FADE_OUT_MS / 1000), len(out))
+        out[len(out) - fade:] *= np.linspace(1, 0, fade)
+    return out, 1000 * start / rate, 1000 * (len(samples) - end) / rate
+
+
+def normalize(samples, peak_db=PEAK_DB):
+    """(scaled samples, gain in dB)."""
+    peak = np.max(np.abs(samples)) if len(samples) else 0.0
+    if peak == 0:
+        return samples, 0.0
+    gain = 10 ** (peak_db / 20) / peak
+    return samples * gain, 20 * np.log10(gain)
+
+
+def write_wav(path, samples, rate):
+    pcm = np.clip(np.round(samples * 32767), -32768, 32767).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm.tobytes())
+
+
+def mulaw_encode(samples):
+    """G.711 μ-law bytes of float samples (-1..1)."""
+    x = np.clip(np.round(samples * 32767), -32768, 32767).astype(np.int32)
+    sign = np.where(x < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(x), 32635) + 0x84
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 7
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def write_mulaw_wav(path, samples, rate):
+    """Mono μ-law WAV (format tag 7); the wave module only writes PCM."""
+    data = mulaw_encode(samples)
+    pad = b"\0" * (len(data) & 1)
+    fmt = struct.pack("<HHIIHHH", 7, 1, rate, rate, 1, 8, 0)
+    fact = struct.pack("<I", len(data))
+    with open(path, "wb") as f:
+        f.write(b"RIFF" + struct.pack("<I", 4 + 8 + len(fmt) + 8 + len(fact) + 8 + len(data) + len(pad))
+                + b"WAVE")
+        f.write(b"fmt " + struct.pack("<I", len(fmt)) + fmt)
+        f.write(b"fact" + struct.pack("<I", len(fact)) + fact)
+        f.write(b"data" + struct.pack("<I", len(data)) + data + pad)
+    return os.path.getsize(path)
+
+
+def optimize(path, out_path, rate, args):
+    samples, src_rate = read_wav(path)
+    with wave.open(path, "rb") as w:
+        src_format = f"{w.getframerate()} Hz {w.getnchannels()}ch {8 * w.getsampwidth()}-bit"
+    samples = resample(samples.astype(np.float64), src_rate, rate)
+    samples, lead_ms, tail_ms = trim(samples, rate, args.trim_tail, args.silence_db)
+    samples, gain_db = normalize(samples, args.peak_db)
+    mulaw = args.mulaw and 2 * len(samples) >= args.mulaw_min_bytes
+    if out_path:
+        (write_mulaw_wav if mulaw else write_wav)(out_path, samples, rate)
+    return {
+        "file": os.path.basename(path),
+        "format": src_format,
+        "encoding": "mu-law" if mulaw else "PCM",
+        "before": os.path.getsize(path),
+        # what write_mulaw_wav() / write_wav() produce
+        "after": 58 + len(samples) + len(samples) % 2 if mulaw else 44 + 2 * len(samples),
+        "lead_ms": lead_ms,
+        "tail_ms": tail_ms,
+        "gain_db": gain_db,
+    }
+
+
+def check_loads(paths, rate):
+    """Load the outputs through sounds.SoundRegistry, as code.py does."""
+    def RawSample(buffer, *, channel_count=1, sample_rate=8000, single_buffer=True):
+        return buffer
+
+    def WaveFile(f, buffer=None):
+        return f
+    # sounds.py imports audiocore; only the format checks matter here
+    sys.modules.setdefault("audiocore", types.ModuleType("audiocore"))
+    sys.modules["audiocore"].RawSample = RawSample
+    sys.modules["audiocore"].WaveFile = WaveFile
+    import mulaw
+    import sounds
+
+    registry = sounds.SoundRegistry(playing=lambda sample: False, stop=lambda sample: None)
+    problems = []
+    placement = {}
+    for path in paths:
+        name = os.path.basename(path)
+        if not registry.add(name, path):
+            problems.append(f"{name}: does not load")
+            continue
+        with open(path, "rb") as f:
+            fmt, sample_rate, channels, bits, _ = sounds.read_wav_format(f)
+        if fmt == mulaw.WAVE_FORMAT_MULAW:
+            bits = 16       # what it is decoded to
+        if (sample_rate, channels, bits) != (rate, 1, 16):
+            problems.append(f"{name}: {sample_rate} Hz {channels}ch {bits}-bit, mixer needs {rate} Hz mono 16-bit")
+        if name in registry.resident:
+            placement[name] = "RAM"
+        else:
+            placement[name] = "mu-law stream" if name in registry.mulaw else "stream"
+    return placement, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("files", nargs="*", help="WAV files (default: sounds/*.wav)")
+    parser.add_argument("--out", default="optimized", help="output directory (default: optimized/)")
+    parser.add_argument("--in-place", action="store_true", help="overwrite the input files")
+    parser.add_argument("--dry-run", action="store_true", help="only report, write nothing")
+    parser.add_argument("--rate", type=int, help="output sample rate (default: MIXER_SAMPLE_RATE in code.py)")
+    parser.add_argument("--trim-tail", action="store_true", help="also trim trailing silence")
+    parser.add_argument("--silence-db", type=float, default=SILENCE_DB,
+                        help="silence threshold, dB below the peak (default %(default)s)")
+    parser.add_argument("--peak-db", type=float, default=PEAK_DB,
+                        help="normalized peak level, dBFS (default %(default)s)")
+    parser.add_argument("--mulaw", action="store_true", help="store long sounds as mu-law (see mulaw.py)")
+    parser.add_argument("--mulaw-min-bytes", type=int, default=MULAW_MIN_BYTES,
+                        help="PCM size from which --mulaw applies (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    files = args.files or sorted(glob.glob(os.path.join(ROOT, "sounds", "*.wav")))
+    if not files:
+        sys.exit("no WAV files")
+    rate = args.rate or mixer_sample_rate()
+    if rate != mixer_sample_rate():
+        print(f"warning: {rate} Hz does not match MIXER_SAMPLE_RATE ({mixer_sample_rate()} Hz) "
+              "in code.py; the mixer will refuse these files\n")
+    if not args.in_place and not args.dry_run:
+        os.makedirs(args.out, exist_ok=True)
+
+    outputs = []
+    results = []
+    for path in files:
+        out_path = None
+        if not args.dry_run:
+            out_path = path if args.in_place else os.path.join(args.out, os.path.basename(path))
+            outputs.append(out_path)
+        results.append(optimize(path, out_path, rate, args))
+
+    print(f"Target: {rate} Hz mono 16-bit, peak {args.peak_db:+.1f} dBFS\n")
+    print(f"{'file':16s} {'source':22s} {'bytes':>8s} {'->':>2s} {'bytes':>8s} {'as':6s} "
+          f"{'saved':>7s} {'lead cut':>9s} {'tail cut':>9s} {'gain':>7s}")
+    for r in results:
+        saved = r["before"] - r["after"]
+        print(f"{r['file']:16s} {r['format']:22s} {r['before']:8d} -> {r['after']:8d} {r['encoding']:6s} "
+              f"{saved:7d} {r['lead_ms']:7.1f}ms {r['tail_ms']:7.1f}ms {r['gain_db']:+6.1f}dB")
+    before = sum(r["before"] for r in results)
+    after = sum(r["after"] for r in results)
+    print(f"\nFlash: {before} -> {after} bytes, {before - after} saved "
+          f"({100 * (before - after) / before:.0f}%)")
+    print("lead cut: silence removed in front of the sound; it is heard that much sooner after play()")
+
+    if outputs:
+        placement, problems = check_loads(outputs, rate)
+        print("\nLoaded through sounds.SoundRegistry: "
+              + ", ".join(f"{name} ({where})" for name, where in placement.items()))
+        for problem in problems:
+            print("ERROR:", problem)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
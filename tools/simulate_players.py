@@ -0,0 +1,207 @@
+"""
+Monte Carlo player simulator (runs on a computer, not the board).
+
+Generates IMU traces for modelled players with NumPy, runs them through the
+game's own ShakeDetector (detector.py) and scorer (levels.py) in a process
+pool, and prints pass rates over a grid of MIN_SCORE and hit tolerances:
+
+    python tools/simulate_players.py
+    python tools/simulate_players.py --players casual --trials 2000 --json out.json
+    python tools/simulate_players.py --jitter 0.04 --strength 1.5 --noise 0.8
+
+Use it to pick MIN_SCORE (code.py) and the tolerance constants (levels.py)
+from data instead of by feel. Requires numpy.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from multiprocessing import Pool
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from detector import GRAVITY, ShakeDetector, thresholds_from_peaks  # noqa: E402
+from levels import LEVELS, prepare_levels, score_hits  # noqa: E402
+
+# Player models: timing jitter (s, std dev), strike strength (extra g at the
+# peak, mean and spread), sensor noise (m/s^2 and rad/s std dev), chance to
+# skip a beat, and how late they start after the input phase opens (s).
+PLAYERS = {
+    "pro":      dict(jitter=0.015, strength=3.0, strength_sd=0.3, noise=0.3, miss=0.00, start=0.3),
+    "casual":   dict(jitter=0.040, strength=2.2, strength_sd=0.5, noise=0.5, miss=0.02, start=0.5),
+    "beginner": dict(jitter=0.080, strength=1.6, strength_sd=0.6, noise=0.7, miss=0.05, start=0.8),
+}
+
+STRIKE_WIDTH = 0.05      # s, accel pulse of a strike (half sine)
+SWING_WIDTH = 0.12       # s, gyro pulse of the swing leading into a strike
+GYRO_PER_G = 3.0         # rad/s of swing per g of strike
+CALIBRATION_BOOST = 1.3  # players shake harder while calibrating
+
+TOLERANCES = [0.05, 0.075, 0.10, 0.125, 0.15, 0.20]
+MIN_SCORES = [50, 60, 70, 80, 90, 100]
+
+
+def sensor_period():
+    """SENSOR_POLL_MS from code.py, in s: how often the game reads the IMU."""
+    with open(os.path.join(ROOT, "code.py"), encoding="utf-8") as f:
+        m = re.search(r"^SENSOR_POLL_MS = (\d+)", f.read(), re.M)
+    return int(m.group(1)) / 1000 if m else 0.005
+
+
+def simulate_traces(pattern, trials, player, period, rng):
+    """
+    Vectorized IMU traces for one level's input phase.
+    Returns (times[samples], accel[trials, samples, 3], gyro[trials, samples, 3]).
+    """
+    pattern = np.asarray(pattern, dtype=float)
+    window = pattern[-1] * 2  # same input window as run_level
+    t = np.arange(0.0, window, period)
+
+    # Hit times per trial: start delay + pattern shape + jitter
+    start = player["start"] + np.abs(rng.normal(0, 0.1, (trials, 1)))
+    hits = start + (pattern - pattern[0]) + rng.normal(0, player["jitter"], (trials, len(pattern)))
+    strength = np.maximum(
+        rng.normal(player["strength"], player["strength_sd"], (trials, len(pattern))), 0.1
+    )
+    strength[rng.random((trials, len(pattern))) < player["miss"]] = 0.0
+
+    # (trials, beats, samples) phase of each sample relative to each hit
+    dt = t[None, None, :] - hits[:, :, None]
+    strike = np.where((dt >= 0) & (dt < STRIKE_WIDTH), np.sin(np.pi * dt / STRIKE_WIDTH), 0.0)
+    swing = np.where(
+        (dt >= -SWING_WIDTH) & (dt < 0), np.sin(np.pi * (dt + SWING_WIDTH) / SWING_WIDTH), 0.0
+    )
+    extra_g = (strike * strength[:, :, None]).sum(axis=1)
+    spin = (swing * strength[:, :, None] * GYRO_PER_G).sum(axis=1)
+
+    noise = player["noise"]
+    accel = rng.normal(0, noise, (trials, len(t), 3))
+    accel[:, :, 2] += GRAVITY * (1 + extra_g)
+    gyro = rng.normal(0, noise * 0.2, (trials, len(t), 3))
+    gyro[:, :, 0] += spin
+    return t, accel, gyro
+
+
+def calibrated_thresholds(player):
+    """Thresholds quick_calibration would compute for this player."""
+    peak = player["strength"] * CALIBRATION_BOOST
+    return thresholds_from_peaks(peak, peak * GYRO_PER_G)
+
+
+def run_chunk(job):
+    """Worker: simulate `trials` attempts at one level. Returns scores[trials, tolerances]."""
+    level_idx, player, trials, tolerances, period, seed = job
+    rng = np.random.default_rng(seed)
+    level = LEVELS[level_idx]
+    accel_th, gyro_th = calibrated_thresholds(player)
+
+    t, accel, gyro = simulate_traces(level.pattern, trials, player, period, rng)
+    times = np.round(t * 1000).astype(int).tolist()  # ticks, as the game sees them
+
+    prepare_levels([level], round(period * 1000))
+    auto_tolerance = level.tolerance_ms
+
+    scores = np.zeros((trials, len(tolerances) + 1), dtype=np.int16)
+    detector = ShakeDetector(accel_th, gyro_th)
+    for n in range(trials):
+        detector.reset()
+        a = accel[n].tolist()
+        g = gyro[n].tolist()
+        shakes = [
+            now for now, (ax, ay, az), (gx, gy, gz) in zip(times, a, g)
+            if detector.update(ax, ay, az, gx, gy, gz, now)
+        ]
+        for k, tol in enumerate(tolerances):
+            level.tolerance_ms = round(tol * 1000)
+            scores[n, k] = score_hits(level, shakes)[0]
+        level.tolerance_ms = auto_tolerance
+        scores[n, -1] = score_hits(level, shakes)[0]
+    return level_idx, scores
+
+
+def simulate(player, trials, tolerances, period, processes, seed, chunk=250):
+    """Scores for every level: {level index: scores[trials, tolerances + auto]}."""
+    seeds = np.random.SeedSequence(seed)
+    jobs = []
+    for level_idx in range(len(LEVELS)):
+        for start in range(0, trials, chunk):
+            n = min(chunk, trials - start)
+            jobs.append((level_idx, player, n, tolerances, period, seeds.spawn(1)[0]))
+
+    results = {}
+    with Pool(processes) as pool:
+        for level_idx, scores in pool.imap_unordered(run_chunk, jobs):
+            results.setdefault(level_idx, []).append(scores)
+    return {i: np.concatenate(parts) for i, parts in results.items()}
+
+
+def pass_rates(scores, min_scores):
+    """pass rate[tolerance column, min score]"""
+    return np.stack([(scores >= m).mean(axis=0) for m in min_scores], axis=1)
+
+
+def print_table(title, rates, tolerances, min_scores):
+    print(title)
+    print("  tolerance  " + "".join(f"  >={m:<4d}" for m in min_scores))
+    labels = [f"±{tol*1000:.0f} ms" for tol in tolerances] + ["per-level"]
+    for label, row in zip(labels, rates):
+        print(f"  {label:<10s} " + "".join(f"  {r*100:5.1f}%" for r in row))
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--players", nargs="+", default=list(PLAYERS), choices=list(PLAYERS) + ["custom"])
+    parser.add_argument("--trials", type=int, default=500, help="attempts per level per player")
+    parser.add_argument("--jitter", type=float, help="custom player: timing jitter (s)")
+    parser.add_argument("--strength", type=float, help="custom player: strike strength (g)")
+    parser.add_argument("--noise", type=float, help="custom player: sensor noise")
+    parser.add_argument("--period", type=float, default=sensor_period(),
+                        help="sensor loop period (s; default: code.py's SENSOR_POLL_MS)")
+    parser.add_argument("--tolerances", type=float, nargs="+", default=TOLERANCES)
+    parser.add_argument("--min-scores", type=int, nargs="+", default=MIN_SCORES)
+    parser.add_argument("--per-level", action="store_true", help="also print a table per level")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write all pass rates to this file")
+    args = parser.parse_args(argv)
+
+    players = {name: PLAYERS[name] for name in args.players if name in PLAYERS}
+    if "custom" in args.players or args.jitter is not None or args.strength is not None or args.noise is not None:
+        custom = dict(PLAYERS["casual"])
+        for key in ("jitter", "strength", "noise"):
+            if getattr(args, key) is not None:
+                custom[key] = getattr(args, key)
+        players["custom"] = custom
+
+    report = {
+        "trials": args.trials, "period": args.period,
+        "tolerances": args.tolerances + ["per-level"], "min_scores": args.min_scores,
+        "players": {},
+    }
+    for name, player in players.items():
+        results = simulate(player, args.trials, args.tolerances, args.period, args.processes, args.seed)
+        overall = pass_rates(np.concatenate(list(results.values())), args.min_scores)
+        print_table(f"== {name} {player} ==", overall, args.tolerances, args.min_scores)
+
+        levels = {}
+        for idx in sorted(results):
+            rates = pass_rates(results[idx], args.min_scores)
+            levels[LEVELS[idx].name] = rates.tolist()
+            if args.per_level:
+                print_table(f"  {LEVELS[idx].name}", rates, args.tolerances, args.min_scores)
+        report["players"][name] = {"model": player, "overall": overall.tolist(), "levels": levels}
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Wrote", args.json)
+
+
+if __name__ == "__main__":
+    main()
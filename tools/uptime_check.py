@@ -0,0 +1,226 @@
+"""
+Simulated long-uptime timing check (runs on a computer, not the board).
+
+Runs the game's real timing code (timebase.py, scheduler.py, detector.py,
+levels.py) against a virtual clock that starts at multi-day uptimes,
+including right across the 2**29 ms tick wrap (~6.2 days), and checks that
+beat times, shake cooldowns and scores come out exactly as at boot. It
+also checks that a shake after an idle gap longer than half the tick
+period (where ticks_diff from the previous shake wraps negative) is
+still detected.
+
+Then it plays the whole game as it runs on the board (code.py's async
+tasks, in hostsim's virtual time) from the same kind of uptimes, in
+normal and practice mode, with the wrap falling during calibration and
+during rounds, and checks that clap times, detections, sounds and scores
+match the run from boot.
+
+For comparison it also shows what float time.monotonic() would do on the
+device: CircuitPython floats carry a 22-bit significand, so the step
+between representable timestamps grows with uptime.
+
+    python tools/uptime_check.py
+
+Exits with status 1 if any integer-tick result differs from uptime 0.
+"""
+
+import math
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class VirtualClock:
+    def __init__(self):
+        self.ns = 0
+
+    def ticks_ms(self):
+        return (self.ns // 1_000_000) & ((1 << 29) - 1)
+
+    def sleep(self, seconds):
+        self.ns += int(seconds * 1_000_000_000)
+
+    def advance_ms(self, ms):
+        self.ns += ms * 1_000_000
+
+
+clock = VirtualClock()
+
+# timebase.py takes ticks_ms from supervisor, exactly as on the board
+supervisor = types.ModuleType("supervisor")
+supervisor.ticks_ms = clock.ticks_ms
+sys.modules["supervisor"] = supervisor
+
+import scheduler  # noqa: E402
+from detector import GRAVITY, ShakeDetector  # noqa: E402
+from levels import LEVELS, prepare_levels, score_hits  # noqa: E402
+from timebase import ticks_add, ticks_diff, ticks_ms  # noqa: E402
+
+scheduler.time = types.SimpleNamespace(sleep=clock.sleep)
+
+DAY_MS = 24 * 3600 * 1000
+WRAP_MS = 1 << 29
+UPTIMES = [
+    ("boot", 0),
+    ("1 hour", 3600 * 1000),
+    ("1 day", DAY_MS),
+    ("3 days", 3 * DAY_MS),
+    ("wrap-1s", WRAP_MS - 1000),   # the level straddles the tick wrap
+    ("7 days", 7 * DAY_MS),
+    ("30 days", 30 * DAY_MS),
+]
+POLL_MS = 5
+GAME_ROUNDS = 4
+GAME_UPTIMES = [
+    ("boot", 0),
+    ("3 days", 3 * DAY_MS),
+    ("wrap-5s", WRAP_MS - 5000),     # wraps during calibration
+    ("wrap-20s", WRAP_MS - 20000),   # wraps during the first rounds
+    ("wrap-40s", WRAP_MS - 40000),
+    ("7 days", 7 * DAY_MS),
+    ("30 days", 30 * DAY_MS),
+]
+CP_FLOAT_BITS = 22  # significand bits of a CircuitPython float
+
+
+def cp_float(x):
+    """Round x the way a CircuitPython float would store it."""
+    if x == 0:
+        return 0.0
+    exp = math.floor(math.log2(abs(x))) + 1 - CP_FLOAT_BITS
+    return round(x / 2.0 ** exp) * 2.0 ** exp
+
+
+def run_level_at(level, uptime_ms, jitter):
+    """
+    Play `level` through the scheduler starting at `uptime_ms`, with a
+    simulated player hitting each beat `jitter[i]` ms late during the input
+    phase. Returns (beat offsets, hit times, score, float timestamp error).
+    """
+    clock.ns = uptime_ms * 1_000_000
+    sched = scheduler.Scheduler()
+    detector = ShakeDetector(accel_th=0.8, gyro_th=3.0)
+    play_start = ticks_ms()
+    duration = level.duration_ms
+    input_offset = ticks_add(play_start, duration)
+    # absolute strike times in virtual ms since "boot"
+    strikes = [uptime_ms + duration + 500 + b - level.first_ms + j
+               for b, j in zip(level.pattern_ms, jitter)]
+
+    beats, hits = [], []
+    worst_float_err = 0.0
+
+    def clap(now):
+        nonlocal worst_float_err
+        beats.append(ticks_diff(now, play_start))
+        t = clock.ns / 1e9
+        worst_float_err = max(worst_float_err, abs(cp_float(t) - t))
+
+    def poll(now):
+        virtual_ms = clock.ns // 1_000_000
+        striking = any(0 <= virtual_ms - s < 30 for s in strikes)
+        az = GRAVITY * (1 + 3.0) if striking else GRAVITY
+        if detector.update(0.0, 0.0, az, 0.0, 0.0, 0.0, now):
+            hits.append(ticks_diff(now, input_offset))
+
+    for b in level.pattern_ms:
+        sched.at(ticks_add(play_start, b), "beat", clap, priority=0)
+    sched.every(POLL_MS, "poll", poll, ticks_add(play_start, duration + 200))
+    sched.at(ticks_add(play_start, 3 * duration), "phase", lambda now: sched.stop())
+    sched.run()
+
+    score = score_hits(level, hits)[0]
+    return beats, hits, score, worst_float_err, sched.stats
+
+
+def cooldown_decisions(uptime_ms):
+    """Strikes 240 ms then 260 ms apart: the cooldown must reject only the first gap."""
+    clock.ns = uptime_ms * 1_000_000
+    detector = ShakeDetector(accel_th=0.8, gyro_th=3.0)
+    strikes = {0, 240, 500}
+    decisions = []
+    for t in range(0, 600, POLL_MS):
+        az = GRAVITY * 4 if any(0 <= t - s < 10 for s in strikes) else GRAVITY
+        if detector.update(0.0, 0.0, az, 0.0, 0.0, 0.0, ticks_ms()):
+            decisions.append(t)
+        clock.advance_ms(POLL_MS)
+    return decisions
+
+
+def shake_after_idle(gap_ms):
+    """A shake, no IMU reads for gap_ms, then another shake: True if it is detected."""
+    clock.ns = 0
+    detector = ShakeDetector(accel_th=0.8, gyro_th=3.0)
+    detector.update(0.0, 0.0, GRAVITY * 4, 0.0, 0.0, 0.0, ticks_ms())
+    detector.update(0.0, 0.0, GRAVITY, 0.0, 0.0, 0.0, ticks_ms())
+    clock.advance_ms(gap_ms)
+    detector.accel_f = 0    # the filter settled long ago
+    return detector.update(0.0, 0.0, GRAVITY * 4, 0.0, 0.0, 0.0, ticks_ms())
+
+
+def run_game_at(uptime_ms, practice):
+    """
+    code.py's async runtime for GAME_ROUNDS rounds, started at `uptime_ms`.
+    Returns what it did, in ms since it started.
+    """
+    import hostsim
+    overrides = {"PRACTICE_MODE": "True"} if practice else {}
+    result = hostsim.Simulation(rounds=GAME_ROUNDS, overrides=overrides, quiet=True,
+                                uptime_ms=uptime_ms).run()
+    return (result.scheduled_beats, result.detections, result.audio_starts,
+            result.scores, result.reason)
+
+
+def main():
+    prepare_levels(LEVELS, POLL_MS)
+    level = next(lv for lv in LEVELS if lv.name.startswith("Level 12"))
+    jitter = [0, 12, -8, 5, 0, -3, 9]
+
+    print(f"{level.name}: beats {level.pattern_ms} ms, tolerance ±{level.tolerance_ms} ms\n")
+    print(f"{'uptime':<9s} {'beats ok':<9s} {'hits (ms)':<40s} {'score':<6s} "
+          f"{'cooldown':<14s} {'worst late':<11s} {'float step'}")
+
+    reference = None
+    failed = False
+    for label, uptime in UPTIMES:
+        beats, hits, score, float_err, stats = run_level_at(level, uptime, jitter)
+        decisions = cooldown_decisions(uptime)
+        worst_late = max(s.worst for s in stats.values())
+        result = (beats, hits, score, decisions, worst_late)
+        if reference is None:
+            reference = result
+        ok = result == reference
+        failed |= not ok
+        print(f"{label:<9s} {str(beats == level.pattern_ms):<9s} {str(hits):<40s} {score:<6d} "
+              f"{str(decisions):<14s} {worst_late:<11d} ±{float_err*1000:.1f} ms"
+              f"{'' if ok else '   <-- DIFFERS'}")
+
+    print("\nShake after an idle gap (no IMU reads):")
+    for label, gap in (("1 s", 1000), ("2**28 ms + 1 s", WRAP_MS // 2 + 1000),
+                       ("2**29 ms - 100 ms", WRAP_MS - 100)):
+        detected = shake_after_idle(gap)
+        failed |= not detected
+        print(f"  {label:<18s} {'detected' if detected else 'MISSED   <-- cooldown wrapped'}")
+
+    for practice in (False, True):
+        print(f"\nThe game ({'practice' if practice else 'normal'} mode, code.py's async tasks):")
+        reference = None
+        for label, uptime in GAME_UPTIMES:
+            beats, detections, sounds, scores, reason = result = run_game_at(uptime, practice)
+            if reference is None:
+                reference = result
+            ok = result == reference
+            failed |= not ok
+            print(f"  {label:<9s} claps {len(beats):<3d} detections {len(detections):<3d} "
+                  f"sounds {len(sounds):<3d} scores {scores}{'' if ok else '   <-- DIFFERS'}")
+
+    print("\nInteger ticks: identical at every uptime." if not failed else "\nFAILED: timing depends on uptime.")
+    print("'float step' is how far a float time.monotonic() timestamp would be off at that uptime.")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
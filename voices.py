@@ -0,0 +1,73 @@
+# ------------------------------------------------------------
+# MULTI-VOICE AUDIO
+# ------------------------------------------------------------
+#
+# With a single AudioOut every sound stops the previous one, so the beat
+# feedback of a hit cuts off the pattern's claps and the go cue. An
+# audiomixer.Mixer gives several voices that play at the same time; each
+# named channel owns one voice:
+#
+#     voices = VoiceManager(mixer.voice, {"cue": (0, 1.0), "pattern": (1, 1.0)})
+#     voices.play(clap_wav, "pattern")
+#
+# Inside a channel a new sound replaces the one playing unless that one
+# has a higher priority, in which case the new one is dropped (and
+# counted). Channels never cut each other off.
+#
+# Plain Python: it only needs voice objects with play(), stop(), playing
+# and level (audiomixer's MixerVoice, or a fake on a computer). play()
+# allocates nothing, so it is safe in the IMU sampling path.
+
+
+class VoiceManager:
+    def __init__(self, voices, channels):
+        """
+        voices: the mixer's voice list. channels: {name: (voice index,
+        level)}, level 0.0-1.0 (voices are summed, so keep the total of
+        sounds that overlap loud ones below clipping).
+        """
+        self.voices = voices
+        self.channels = {}
+        for name, (index, level) in channels.items():
+            self.channels[name] = index
+            voices[index].level = level
+        self.priority = [0] * len(voices)   # priority of each voice's current sound
+        self.current = [None] * len(voices)  # sample each voice was last started with
+        self.reset()
+
+    def reset(self):
+        self.plays = 0
+        self.replaced = 0       # sounds cut off by a newer one on the same channel
+        self.dropped = 0        # sounds not played: a higher priority one was playing
+
+    def play(self, sample, channel, priority=0, loop=False):
+        """Start 'sample' on 'channel'; False if it was dropped."""
+        index = self.channels[channel]
+        voice = self.voices[index]
+        if voice.playing:
+            if priority < self.priority[index]:
+                self.dropped += 1
+                return False
+            self.replaced += 1
+        self.priority[index] = priority
+        self.current[index] = sample
+        voice.play(sample, loop=loop)
+        self.plays += 1
+        return True
+
+    def is_playing(self, sample):
+        for i in range(len(self.voices)):
+            if self.current[i] is sample and self.voices[i].playing:
+                return True
+        return False
+
+    def stop_sample(self, sample):
+        """Stop every voice playing 'sample' (e.g. before its file is closed)."""
+        for i in range(len(self.voices)):
+            if self.current[i] is sample:
+                self.voices[i].stop()
+                self.current[i] = None
+
+    def summary(self):
+        return (f"voices plays={self.plays} replaced={self.replaced} "
+                f"dropped={self.dropped}")